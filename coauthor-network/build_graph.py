@@ -1,35 +1,129 @@
-import networkx as nx
-import pickle
+import io
+import os
+import sys
+import gzip
+import numpy as np
+
+# Use the graph file helpers of the web-crawling project
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "web-crawling"))
+from csr_graph import csr_from_edges, from_csr, is_csr, save_csr, save_graph
 
 def main():
-    process_graph("data/gr_qc_coauthorships.txt", "out/gr_qc_coauthorships.pkl")
-
-def process_graph(graph_text_file, save_file):
-    # Create a new undirected graph
-    G = nx.Graph()
-
-    # Open the file in read mode
-    with open(graph_text_file, "r") as f:
-        print("Reading graph from", graph_text_file)
-
-        # Read each line in the file
-        for line in f:
-            # Split the line by space and convert strings to ints
-            nodes = list(map(int, line.split()))
-            # Add an edge between the two nodes (adding nodes if necessary)
-            G.add_edge(nodes[0], nodes[1])
-    
+    process_graph("data/gr_qc_coauthorships.txt", "out/gr_qc_coauthorships.csr")
+
+# Build the undirected graph of an edge list file and save it, in CSR format if the save file
+# ends in .csr (written straight from the edge arrays) and as a pickled nx.Graph otherwise.
+# The file has one edge per line as integer node ids separated by spaces or tabs (any further
+# columns are ignored), may have comment lines starting with # or %, and may be gzipped.
+# Repeated edges are kept once, and nodes are numbered in the order they first appear.
+def process_graph(graph_text_file, save_file, chunk_bytes=64 * 1024 * 1024):
+    print("Reading graph from", graph_text_file)
+    csr = read_edge_list(graph_text_file, chunk_bytes)
+
     # Check if the graph is empty
-    if (len(G.nodes()) == 0):
+    if (csr.number_of_nodes() == 0):
         print("No nodes found in the graph")
         return
 
     # Save the graph to a file
-    with open(save_file, "wb") as f:
-        pickle.dump(G, f)
+    if is_csr(save_file):
+        save_csr(csr, save_file)
+    else:
+        save_graph(from_csr(csr), save_file)
 
     # Print end message.
-    print("Undirected graph with n =", len(G.nodes()), "nodes and m =", len(G.edges()), "edges has been saved to", save_file)
-    
+    print("Undirected graph with n =", csr.number_of_nodes(), "nodes and m =", csr.number_of_edges(), "edges has been saved to", save_file)
+
+# Read an edge list file into an undirected CSRGraph labelled with the original node ids.
+# The file is parsed chunk by chunk with NumPy, and the repeated edges within each chunk are
+# dropped as it is read. Edges repeated across chunks are only merged at the end, so memory grows
+# with the distinct edges of every chunk added up: the number of distinct edges when the repeats
+# are close together in the file, up to the number of lines when they are spread across chunks.
+def read_edge_list(graph_text_file, chunk_bytes=64 * 1024 * 1024):
+    sources, targets = [], []
+    # The node ids in order of first appearance, and the same ids sorted for lookups.
+    new_nodes, seen = [], np.empty(0, dtype=np.int64)
+    for edges in read_edge_chunks(graph_text_file, chunk_bytes):
+        # Record the nodes appearing for the first time, in the order they appear.
+        ids = edges.ravel()
+        order = np.argsort(ids, kind="stable")
+        sorted_ids = ids[order]
+        first = np.ones(len(ids), dtype=bool)
+        first[1:] = sorted_ids[1:] != sorted_ids[:-1]
+        chunk_nodes, first_seen = sorted_ids[first], order[first]
+        position = np.minimum(np.searchsorted(seen, chunk_nodes), max(len(seen) - 1, 0))
+        new = seen[position] != chunk_nodes if len(seen) else np.ones(len(chunk_nodes), dtype=bool)
+        new_nodes.append(chunk_nodes[new][np.argsort(first_seen[new])])
+        seen = np.sort(np.concatenate((seen, chunk_nodes[new])))
+
+        # Keep every undirected edge once, as (smaller id, larger id).
+        u, v = unique_pairs(np.minimum(edges[:, 0], edges[:, 1]), np.maximum(edges[:, 0], edges[:, 1]))
+        sources.append(u)
+        targets.append(v)
+
+    if not new_nodes:
+        return csr_from_edges([], [], 0, False)
+    nodes = np.concatenate(new_nodes)
+    u, v = unique_pairs(np.concatenate(sources), np.concatenate(targets))
+
+    # Number the nodes in order of first appearance, through a lookup table when the ids are
+    # small enough and by binary search otherwise.
+    if nodes.min() >= 0 and nodes.max() < 4 * len(nodes) + 1024 * 1024:
+        index = np.empty(nodes.max() + 1, dtype=np.int64)
+        index[nodes] = np.arange(len(nodes))
+        u, v = index[u], index[v]
+    else:
+        order = np.argsort(nodes)
+        sorted_nodes = nodes[order]
+        u = order[np.searchsorted(sorted_nodes, u)]
+        v = order[np.searchsorted(sorted_nodes, v)]
+    labels = None if np.array_equal(nodes, np.arange(len(nodes))) else nodes
+    return csr_from_edges(u, v, len(nodes), False, labels)
+
+# Parse an edge list file in chunks of about chunk_bytes, yielding an (edges, 2) int array of the
+# node id pairs in each chunk. Only the first two columns are parsed, so further columns (like
+# float weights) can hold anything, and lines may have different numbers of columns.
+def read_edge_chunks(graph_text_file, chunk_bytes=64 * 1024 * 1024):
+    with open_edge_list(graph_text_file) as f:
+        while True:
+            # Read a chunk and complete its last line.
+            chunk = f.read(chunk_bytes)
+            if not chunk:
+                break
+            chunk += f.readline()
+
+            # Drop the comment lines, which data files usually only have at the top.
+            if b"#" in chunk or b"%" in chunk:
+                chunk = b"\n".join(line for line in chunk.split(b"\n") if not line.lstrip().startswith((b"#", b"%")))
+
+            if not chunk.strip():
+                continue
+
+            # Parse the node ids line by line, skipping the other columns, so that every line is
+            # checked to have at least two integer columns.
+            try:
+                yield np.loadtxt(io.BytesIO(chunk), dtype=np.int64, usecols=(0, 1), ndmin=2)
+            except ValueError as e:
+                raise ValueError("expected at least two integer node ids per line in " + graph_text_file + ": " + str(e))
+
+# Open an edge list file for reading bytes, decompressing it if it is gzipped.
+def open_edge_list(graph_text_file):
+    with open(graph_text_file, "rb") as f:
+        gzipped = f.read(2) == b"\x1f\x8b"
+    return gzip.open(graph_text_file, "rb") if gzipped else open(graph_text_file, "rb")
+
+# Remove the repeated pairs (u[i], v[i]), returning the distinct pairs sorted.
+def unique_pairs(u, v):
+    # Sort the pairs as single 64-bit keys when the ids fit in 31 bits.
+    if len(u) and min(u.min(), v.min()) >= 0 and max(u.max(), v.max()) < 2**31:
+        keys = np.sort((u << 32) | v)
+        keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+        return keys >> 32, keys & 0xFFFFFFFF
+    order = np.lexsort((v, u))
+    u, v = u[order], v[order]
+    keep = np.ones(len(u), dtype=bool)
+    keep[1:] = (u[1:] != u[:-1]) | (v[1:] != v[:-1])
+    return u[keep], v[keep]
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
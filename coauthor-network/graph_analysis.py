@@ -1,106 +1,143 @@
 
 import os
-import pickle
-import networkx as nx
+import sys
 import matplotlib.pyplot as plt
-from matplotlib.backends.backend_pdf import PdfPages
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from PyPDF2 import PdfMerger
 from math import comb
 
-temp_dir = "temp"
-temp_plots_pdf = "temp/plots.pdf"
-temp_text_pdf = "temp/text.pdf"
+# Use the graph file helpers of the web-crawling project
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "web-crawling"))
+from csr_graph import load_csr_graph
+from shortest_paths import path_statistics, path_statistics_lines
+from triangles import clustering_statistics
+from metrics_cache import MetricsCache
+from distributions import degree_cdf
+from layout_cache import get_layout, layouts_dir
+from render import draw_graph
+from report import compute_metrics, write_report, run_tasks, figure_page, text_page
 
 def main():
-    analyze_graph('out/gr_qc_coauthorships.pkl', 'out/gr_qc_coauthorships_analysis.pdf')
-
-def analyze_graph(graph_pkl_file, analysis_pdf_save_file):
-    # Create the temp dir if it doesn't exist
-    os.makedirs(temp_dir, exist_ok=True)
-
-    # Create a PDF file for saving the plots
-    pdf = PdfPages(temp_plots_pdf)
-
-    # Load the graph from the pickle file
-    G = None
+    analyze_graph('out/gr_qc_coauthorships.csr', 'out/gr_qc_coauthorships_analysis.pdf')
+
+# The degrees, clustering and shortest path statistics are cached next to the graph file (see
+# metrics_cache.py) and reused by later analyses of the same graph, unless use_cache is False.
+# metric_params maps "clustering_statistics" and "path_statistics" to the keyword arguments they
+# are computed with (like exact, samples and seed), which are part of their cache keys.
+# With draw_layout, the report ends with a drawing of the whole graph laid out by force_layout.
+# The metrics and the pages of the report are computed in workers processes (by default one per
+# core) and written straight to the report (see report.py), so that analyses can run at once.
+def analyze_graph(graph_file, analysis_pdf_save_file, use_cache=True, workers=None, metric_params=None, draw_layout=False):
+    # Load the graph from the CSR directory (memory-mapped) or pickle file
+    csr = None
     try:
-        with open(graph_pkl_file, 'rb') as f:
-            G = pickle.load(f)
+        csr = load_csr_graph(graph_file)
     except:
         pass
-    if (G is None):
-        print("Error: Graph could not be loaded from", graph_pkl_file)
+    if (csr is None):
+        print("Error: Graph could not be loaded from", graph_file)
         return
     
-    n = G.number_of_nodes()
-    m = G.number_of_edges()
-    print("Loaded undirected graph with n =", n, "nodes and m =", G.number_of_edges(), "edges from", graph_pkl_file)
+    n = csr.number_of_nodes()
+    m = csr.number_of_edges()
+    print("Loaded undirected graph with n =", n, "nodes and m =", m, "edges from", graph_file)
+    metrics = MetricsCache.for_graph(graph_file, csr) if use_cache else MetricsCache(None, None)
+
+    # Calculate the degrees, and the triangles, clustering coefficients and diameters of the
+    # undirected graph, from its CSR arrays. The triangles and diameters spread their work over
+    # their own pools of workers.
+    metric_params = metric_params or {}
+    values = compute_metrics(metrics, {
+        "degrees": (degrees, (csr,)),
+        "clustering_statistics": (clustering_statistics, (csr,), metric_params.get("clustering_statistics", {})),
+        "path_statistics": (path_statistics, (csr,), metric_params.get("path_statistics", {})),
+    }, workers, pooled=("clustering_statistics", "path_statistics"))
+    degree_counts = values["degrees"]
+    clustering = values["clustering_statistics"]
+    path_lines = path_statistics_lines(values["path_statistics"], n)
+
+    # Generate the degree CDF
+    degrees_x, degrees_cdf = degree_cdf(degree_counts)
+
+    pages = [
+        (text_page, (draw_summary, n, m, clustering["transitivity"], clustering["average_clustering"], clustering["total_triangles"], path_lines)),
+        (figure_page, (plot_degree_histogram, degree_counts)),
+        (figure_page, (plot_degree_cdf, degrees_x, degrees_cdf)),
+    ]
+    if draw_layout:
+        pages.append((figure_page, (plot_layout, csr, layouts_dir(graph_file) if use_cache else None)))
+    write_report(pages, analysis_pdf_save_file, workers)
+
+# Analyze several graphs at once, jobs being (graph_file, analysis_pdf_save_file) pairs, one
+# analysis per worker process. An analysis that fails does not stop the others.
+# Returns whether each analysis succeeded.
+def analyze_graphs(jobs, use_cache=True, workers=None):
+    return run_tasks([(analyze_job, (graph_file, save_file, use_cache)) for graph_file, save_file in jobs], workers)
+
+def analyze_job(graph_file, analysis_pdf_save_file, use_cache):
+    try:
+        analyze_graph(graph_file, analysis_pdf_save_file, use_cache, workers=1)
+    except Exception as e:
+        print("Error: Analysis of", graph_file, "failed:", repr(e))
+        return False
+    return os.path.exists(analysis_pdf_save_file)
 
-    
-    # Generate degree distribution histogram
-    degree_counts = [G.degree(node) for node in G.nodes()]
+def degrees(csr):
+    return csr.degree().tolist()
+
+# Generate degree distribution histogram
+def plot_degree_histogram(degree_counts):
     plt.figure(figsize=(8, 4))
     plt.hist(degree_counts, bins=range(0, max(degree_counts)+1), alpha=1, color='purple', label='degrees')
     plt.title("Degree distribution")
     plt.xlabel("Number of edges")
     plt.ylabel("Number of nodes")
-    pdf.savefig()
-    plt.close()
-
 
-    # Generate out-degree and in-degree CDFs
-    degree_cdf = generate_cdf_func(degree_counts)
-
-    # Visualize the out-degree CDF
-    plot_cdf(degree_cdf, 0, max(degree_counts))
+# Visualize the degree CDF
+def plot_degree_cdf(degrees_x, degrees_cdf):
+    plt.plot(degrees_x, degrees_cdf)
     plt.title("CDF of node degrees")
     plt.xlabel("Number of edges")
     plt.ylabel("Probability of having x or fewer edges")
-    pdf.savefig()
-    plt.close()
 
-    # Close the graph PDF
-    pdf.close() 
+# Draw the whole graph (a CSRGraph), laid out by force_layout (see force_layout.py) in a few
+# seconds, or read from the layouts cached in cache_dir
+def plot_layout(csr, cache_dir=None):
+    plt.figure(figsize=(12, 13))
+    plt.title("Force-directed layout of the co-authorship graph", fontsize=20)
+    draw_graph(csr, node_size=4, node_color="tab:blue", edge_color="gray", width=0.2, alpha=0.8, pos=get_layout(csr, "force", cache_dir))
 
-    # Open the PDF file for writing text
-    c = canvas.Canvas(temp_text_pdf, pagesize=letter)
+# Write the clustering, diameter and Erdos-Renyi analysis of the graph on the canvas c.
+def draw_summary(c, n, m, global_CC, avg_CC, T, path_lines):
     c.setFont("Times-Roman", 10)
 
     y = 10 * 72 # 10 inches in points (top of the page)
     x = 1 * 72 # 1 inch in points (left margin)
 
     # Restate the graph. 
-    c.drawString(x, y, "The undirected Co-authorship graph has n = " + str(n) + " nodes and m = " + str(G.number_of_edges()) + " edges.")
+    c.drawString(x, y, "The undirected Co-authorship graph has n = " + str(n) + " nodes and m = " + str(m) + " edges.")
     y -= 40
 
     # Output clustering and diameter analysis.
     c.drawString(x, y, "Clustering and Diameter analysis")
     y -= 25
 
-    # Calculate the global and average clustering coefficients of the undirected graph
-    global_CC = nx.transitivity(G)
-    avg_CC = nx.average_clustering(G)
+    # Output the global and average clustering coefficients of the undirected graph
     c.drawString(x, y, "Global clustering coefficient: " + str(global_CC))
     y -= 20
     c.drawString(x, y, "Average clustering coefficient: " + str(avg_CC))
     y -= 20
 
-    # Calculate the maximum and average diameters of the undirected graph
-    max_diameter = nx.diameter(G)
-    avg_diameter = nx.average_shortest_path_length(G)
-    c.drawString(x, y, "Maximum diameter: " + str(max_diameter))
+    # Output the maximum and average diameters of the undirected graph, on its largest
+    # connected component if it is not connected
+    for line in path_lines:
+        c.drawString(x, y, line)
+        y -= 20
     y -= 20
-    c.drawString(x, y, "Average diameter: " + str(avg_diameter))
-    y -= 40
 
     # Output the Erdos-Renyi comparison. 
     c.drawString(x, y, "Erdos-Renyi comparison")
     y -= 25
 
-    # Calculate the number of triangles in the undirected graph
-    T = sum(nx.triangles(G).values()) // 3
+    # Output the number of triangles in the undirected graph
     c.drawString(x, y, "Total number of triangles: " + str(T))
     y -= 20
 
@@ -130,50 +167,5 @@ def analyze_graph(graph_pkl_file, analysis_pdf_save_file):
     c.drawString(x, y, "described by the Pareto distribution, so we know an Erdos-Renyi model would be a poor model for this graph.")
     y -= 15
 
-    # Save text PDF
-    c.save()
-
-    # Combine the plots and text into a single PDF
-    with open(analysis_pdf_save_file, "wb") as f:
-        pdfs = [temp_text_pdf, temp_plots_pdf]
-        merger = PdfMerger()
-        for pdf in pdfs:
-            merger.append(pdf)
-        merger.write(f)
-        merger.close()
-
-    os.remove(temp_plots_pdf)
-    os.remove(temp_text_pdf)
-    try:
-        os.rmdir(temp_dir)
-    except:
-        pass
-
-
-# Generates a CDF function from a list of counts.
-def generate_cdf_func(counts):
-    counts = sorted(counts)
-    max_val = counts[-1]
-    n = len(counts)
-    set_cdf = []
-    count = 0
-    for i in range(max_val):
-        while counts[count] <= i and count < n:
-            count += 1
-        set_cdf.append(count/n)
-    def cdf(x):
-        if (x < 0):
-            return 0.0
-        if (x >= max_val):
-            return 1.0
-        return set_cdf[x]
-    return cdf
-
-# Plots the CDF of a function given the domain range of the CDF.
-def plot_cdf(cdf, min, max):
-    x = range(min, max + 1)
-    y = [cdf(i) for i in x]
-    plt.plot(x, y)
-
 if __name__ == '__main__':
     main()
\ No newline at end of file
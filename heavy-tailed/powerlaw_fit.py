@@ -0,0 +1,220 @@
+import os
+import sys
+import multiprocessing as mp
+import numpy as np
+from scipy import optimize, special, stats
+
+# Use the distribution helpers of the web-crawling project
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "web-crawling"))
+from distributions import value_counts
+
+# Exponents alpha the likelihood is evaluated at before refining its maximum.
+alpha_grid = np.arange(1.01, 6.0, 0.01)
+
+# Largest alpha searched for when the maximum of the likelihood is beyond the grid.
+max_alpha = 50.0
+
+# Fit a discrete power law p(x) = x^-alpha / zeta(alpha, xmin) to the tail x >= xmin of integer
+# data (values below 1 are ignored), following Clauset, Shalizi and Newman.
+# For every candidate xmin (the distinct values with at least min_tail samples from them on, at
+# most max_candidates of them spread over that range) alpha is the maximum likelihood estimate,
+# and the xmin whose fit has the smallest Kolmogorov-Smirnov distance to the tail's empirical CDF
+# is kept. The likelihood is only a function of the number and sum of logarithms of the tail
+# samples, so all candidates are fitted at once on a grid of alpha, refined by a parabola through
+# the best grid point and its neighbors. Candidates whose best grid point is the first or last are
+# searched for beyond the grid with a bounded scalar optimizer instead, up to max_alpha.
+# Pass xmin to fit only that tail.
+# Returns a dictionary with alpha, xmin, ks (the KS distance), sigma (the standard error of
+# alpha), n_tail (the number of samples >= xmin), n, log_likelihood and at_bound (whether alpha is
+# max_alpha, the true estimate being larger).
+def fit_power_law(data, xmin=None, max_candidates=200, min_tail=10):
+    data = np.asarray(data).ravel()
+    data = data[data >= 1].astype(np.int64)
+    values, counts = value_counts(data)
+    if not len(values):
+        raise ValueError("no positive values to fit a power law to")
+
+    # The number of samples and sum of their logarithms from every distinct value on.
+    n_tail = np.cumsum(counts[::-1])[::-1]
+    log_tail = np.cumsum((counts * np.log(values))[::-1])[::-1]
+    if xmin is not None:
+        candidates = np.array([np.searchsorted(values, xmin)])
+        if candidates[0] == len(values):
+            raise ValueError("no values >= xmin = " + str(xmin))
+        xmins = np.array([float(xmin)])
+    else:
+        candidates = np.flatnonzero(n_tail >= min(min_tail, n_tail[0]))
+        if len(candidates) > max_candidates:
+            candidates = np.unique(candidates[np.linspace(0, len(candidates) - 1, max_candidates).round().astype(np.int64)])
+        xmins = values[candidates].astype(np.float64)
+    n = n_tail[candidates]
+
+    # The log-likelihood of every alpha of the grid (rows) for every candidate (columns).
+    log_zeta = np.log(special.zeta(alpha_grid[:, None], xmins[None, :]))
+    likelihood = -alpha_grid[:, None] * log_tail[candidates] - n * log_zeta
+    peak = np.argmax(likelihood, axis=0)
+    best = np.clip(peak, 1, len(alpha_grid) - 2)
+    columns = np.arange(len(candidates))
+    before, at, after = likelihood[best - 1, columns], likelihood[best, columns], likelihood[best + 1, columns]
+    curvature = before - 2 * at + after
+    with np.errstate(divide="ignore", invalid="ignore"):
+        shift = np.where(curvature < 0, 0.5 * (before - after) / curvature, 0.0)
+    step = alpha_grid[1] - alpha_grid[0]
+    alphas = alpha_grid[best] + np.clip(shift, -1, 1) * step
+    at_bound = np.zeros(len(candidates), dtype=bool)
+    for c in np.flatnonzero((peak == 0) | (peak == len(alpha_grid) - 1)):
+        bounds = (1 + 1e-9, alpha_grid[1]) if peak[c] == 0 else (alpha_grid[-2], max_alpha)
+        args = (log_tail[candidates[c]], n[c], xmins[c])
+        result = optimize.minimize_scalar(negative_log_likelihood, bounds=bounds, method="bounded", args=args, options={"xatol": 1e-6})
+        alphas[c] = result.x
+        # The optimizer stops short of the bound when the likelihood still grows there.
+        if peak[c] > 0 and negative_log_likelihood(max_alpha, *args) <= result.fun:
+            alphas[c] = max_alpha
+            at_bound[c] = True
+
+    ks = ks_distances(values, counts, candidates, xmins, alphas)
+    j = int(np.argmin(ks))
+    alpha = float(alphas[j])
+    xmin = int(xmins[j])
+    if at_bound[j]:
+        print("Warning: the power law fit reached alpha =", max_alpha, "and the maximum likelihood estimate is larger")
+    return {
+        "alpha": alpha,
+        "xmin": xmin,
+        "ks": float(ks[j]),
+        "sigma": (alpha - 1) / np.sqrt(n[j]),
+        "n_tail": int(n[j]),
+        "n": len(data),
+        "log_likelihood": float(-alpha * log_tail[candidates[j]] - n[j] * np.log(special.zeta(alpha, xmin))),
+        "at_bound": bool(at_bound[j]),
+    }
+
+# Get minus the log-likelihood of exponent alpha for a tail of n samples >= xmin whose logarithms
+# sum to log_sum (infinite where zeta underflows).
+def negative_log_likelihood(alpha, log_sum, n, xmin):
+    zeta = special.zeta(alpha, xmin)
+    return alpha * log_sum + n * np.log(zeta) if zeta > 0 else np.inf
+
+# Get the KS distance between the fitted power law and the empirical CDF of the tail of every
+# candidate, evaluated at every distinct value and just before it (where the empirical CDF has
+# not jumped yet but the model's has grown the most).
+def ks_distances(values, counts, candidates, xmins, alphas):
+    cumulative = np.concatenate(([0], np.cumsum(counts)))
+    start = cumulative[candidates][:, None]
+    total = cumulative[-1] - start
+    empirical = (cumulative[1:][None, :] - start) / total
+    empirical_before = (cumulative[:-1][None, :] - start) / total
+    norm = special.zeta(alphas, xmins)[:, None]
+    model = 1 - special.zeta(alphas[:, None], values[None, :] + 1.0) / norm
+    model_before = 1 - special.zeta(alphas[:, None], values[None, :].astype(np.float64)) / norm
+    distance = np.maximum(np.abs(empirical - model), np.abs(empirical_before - model_before))
+    # Only the values in the tail of each candidate count.
+    distance[np.arange(len(values))[None, :] < candidates[:, None]] = 0
+    return distance.max(axis=1)
+
+# Get the CCDF P(X > x) of the fitted power law at x >= xmin, as a fraction of all the samples
+# (the tail holds n_tail / n of them), for plotting over the empirical CCDF.
+def power_law_ccdf(fit, x):
+    x = np.asarray(x, dtype=np.float64)
+    return fit["n_tail"] / fit["n"] * special.zeta(fit["alpha"], x + 1) / special.zeta(fit["alpha"], fit["xmin"])
+
+# Draw size samples from a discrete power law on x >= xmin, by inverting its CDF tabulated over
+# the first table_size values and, beyond them, the continuous approximation of Clauset et al.
+def sample_power_law(alpha, xmin, size, rng, table_size=10000):
+    x = np.arange(xmin, xmin + table_size, dtype=np.float64)
+    cdf = 1 - special.zeta(alpha, x + 1) / special.zeta(alpha, xmin)
+    u = rng.random(size)
+    samples = xmin + np.searchsorted(cdf, u).astype(np.int64)
+    beyond = u > cdf[-1]
+    if beyond.any():
+        tail = np.floor((xmin - 0.5) * (1 - u[beyond]) ** (-1 / (alpha - 1)) + 0.5)
+        samples[beyond] = np.maximum(tail, xmin + table_size).astype(np.int64)
+    return samples
+
+# Test whether the data could come from the fitted power law: fit synthetic data sets drawn from
+# the fit (with the samples below xmin resampled from the data) the same way, and return the
+# fraction p of them that are farther from their own fit than the data is (by KS distance).
+# A p below 0.1 rules the power law out. The bootstraps are spread over workers processes.
+# Returns a dictionary with p, bootstraps and the ks distances of the synthetic data sets.
+def goodness_of_fit(data, fit=None, bootstraps=1000, workers=None, seed=None, **options):
+    data = np.asarray(data).ravel()
+    data = data[data >= 1].astype(np.int64)
+    if fit is None:
+        fit = fit_power_law(data, **options)
+    below = data[data < fit["xmin"]]
+    seeds = np.random.SeedSequence(seed).spawn(bootstraps)
+    tasks = [(below, fit, child, options) for child in seeds]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or bootstraps < 2:
+        distances = [bootstrap_distance(task) for task in tasks]
+    else:
+        with mp.get_context().Pool(workers) as pool:
+            distances = pool.map(bootstrap_distance, tasks, chunksize=max(1, bootstraps // (4 * workers)))
+    distances = np.array(distances)
+    return {"p": float(np.mean(distances >= fit["ks"])) if bootstraps else None, "bootstraps": bootstraps, "ks": distances}
+
+# Fit one synthetic data set for goodness_of_fit and return its KS distance.
+def bootstrap_distance(task):
+    below, fit, seed, options = task
+    rng = np.random.default_rng(seed)
+    # Every sample comes from the tail with the probability the data had of being in it.
+    from_tail = rng.random(fit["n"]) < fit["n_tail"] / fit["n"]
+    if not len(below):
+        from_tail[:] = True
+    samples = np.empty(fit["n"], dtype=np.int64)
+    samples[from_tail] = sample_power_law(fit["alpha"], fit["xmin"], int(from_tail.sum()), rng)
+    samples[~from_tail] = rng.choice(below, int((~from_tail).sum())) if len(below) else []
+    return fit_power_law(samples, **options)["ks"]
+
+# Compare the fitted power law with the discrete lognormal and exponential distributions fitted
+# by maximum likelihood to the same tail, with Vuong's likelihood ratio test.
+# For each alternative, returns R, the log-likelihood ratio (positive if the power law fits
+# better), normalized_R = R / (sigma sqrt(n)), and p, the probability of a ratio at least this far
+# from 0 if both fit equally well: the sign of R is only meaningful when p is small.
+def compare_distributions(data, fit=None, **options):
+    data = np.asarray(data).ravel()
+    data = data[data >= 1].astype(np.int64)
+    if fit is None:
+        fit = fit_power_law(data, **options)
+    tail = data[data >= fit["xmin"]].astype(np.float64)
+    xmin = fit["xmin"]
+    power_law = -fit["alpha"] * np.log(tail) - np.log(special.zeta(fit["alpha"], xmin))
+    return {
+        "lognormal": likelihood_ratio(power_law, lognormal_log_likelihoods(tail, xmin)),
+        "exponential": likelihood_ratio(power_law, exponential_log_likelihoods(tail, xmin)),
+    }
+
+def likelihood_ratio(first, second):
+    difference = first - second
+    n = len(difference)
+    R = float(difference.sum())
+    sigma = float(difference.std())
+    if sigma == 0 or n == 0:
+        return {"R": R, "normalized_R": 0.0, "p": 1.0}
+    normalized = R / (sigma * np.sqrt(n))
+    return {"R": R, "normalized_R": float(normalized), "p": float(special.erfc(abs(normalized) / np.sqrt(2)))}
+
+# Get the log-likelihood of every tail sample under the discrete exponential distribution
+# p(x) = (1 - e^-lambda) e^-lambda(x - xmin) fitted by maximum likelihood.
+def exponential_log_likelihoods(tail, xmin):
+    excess = tail.mean() - xmin
+    rate = np.log1p(1 / excess) if excess > 0 else 50.0
+    return np.log(-np.expm1(-rate)) - rate * (tail - xmin)
+
+# Get the log-likelihood of every tail sample under the discrete lognormal distribution (the
+# probability the continuous lognormal gives [x - 1/2, x + 1/2), normalized over x >= xmin) fitted
+# by maximum likelihood.
+def lognormal_log_likelihoods(tail, xmin):
+    lower, upper, start = np.log(tail - 0.5), np.log(tail + 0.5), np.log(xmin - 0.5)
+
+    def log_likelihoods(params):
+        mu, sigma = params[0], np.exp(params[1])
+        a, b, s = (lower - mu) / sigma, (upper - mu) / sigma, (start - mu) / sigma
+        # Take the difference on the side of the median where it does not cancel out.
+        mass = np.where(a > 0, stats.norm.sf(a) - stats.norm.sf(b), stats.norm.cdf(b) - stats.norm.cdf(a))
+        return np.log(np.maximum(mass, 1e-300)) - stats.norm.logsf(s)
+
+    logs = np.log(tail)
+    start_params = [logs.mean(), np.log(max(logs.std(), 0.1))]
+    result = optimize.minimize(lambda params: -log_likelihoods(params).sum(), start_params, method="Nelder-Mead")
+    return log_likelihoods(result.x)
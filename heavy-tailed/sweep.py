@@ -0,0 +1,184 @@
+import os
+import time
+import zlib
+import multiprocessing as mp
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_pdf import PdfPages
+import powerlaw_fit
+from tools import preferential_attachment_edges, configuration_model_edges, multi_edges
+
+# Run many replicates of the heavy-tailed graph models, fit a power law to the degrees of every
+# graph, and collect the fits in a results table to plot the distribution of the estimates.
+def main():
+    tasks = sweep_tasks(["preferential_attachment", "configuration_model"], T=[300, 1000, 3000, 10000], m=[1, 2], replicates=200)
+    run_sweep(tasks, "out/heavy_tailed_sweep.results")
+    plot_sweep("out/heavy_tailed_sweep.results", "out/heavy_tailed_sweep.pdf")
+
+# The columns of the results table, in order: the parameters of a task, then the fit of its degrees.
+key_columns = ["model", "T", "m", "replicate", "seed"]
+fit_columns = ["alpha", "sigma", "xmin", "ks", "n_tail", "max_degree", "mean_degree", "p",
+               "lognormal_R", "lognormal_p", "exponential_R", "exponential_p"]
+
+# Get the degrees of a Preferential Attachment graph with T nodes adding m edges each.
+def preferential_attachment_degrees(T, m, seed):
+    edges = preferential_attachment_edges(T, m, task_rng("preferential_attachment", T, m, seed))
+    return np.bincount(edges.ravel(), minlength=T)
+
+# Get the degrees of a Configuration Model graph (with the self-loops and multi-edges erased) on
+# the degree sequence of the Preferential Attachment graph with the same parameters and seed.
+def configuration_model_degrees(T, m, seed):
+    degrees = preferential_attachment_degrees(T, m, seed)
+    edges = configuration_model_edges(degrees, task_rng("configuration_model", T, m, seed))
+    edges = edges[~(multi_edges(edges, T) | (edges[:, 0] == edges[:, 1]))]
+    return np.bincount(edges.ravel(), minlength=T)
+
+# The models a sweep can run, by name.
+models = {
+    "preferential_attachment": preferential_attachment_degrees,
+    "configuration_model": configuration_model_degrees,
+}
+
+# Get the random generator of a task, seeded by all its parameters (seed being the replicate's
+# seed), so that a task draws the same graph whatever other tasks run, in whatever order.
+def task_rng(model, T, m, seed):
+    return np.random.default_rng([zlib.crc32(model.encode("utf-8")), T, m, seed])
+
+# Get the tasks of a sweep over every combination of the models, numbers of nodes T, edges per
+# node m and replicates 0 ... replicates-1. Replicate r has seed base_seed * 2^32 + r, so different
+# base seeds give independent sweeps.
+def sweep_tasks(model_names, T, m=(1,), replicates=1, base_seed=0):
+    for name in model_names:
+        if name not in models:
+            raise ValueError("unknown model " + repr(name) + ", expected one of " + ", ".join(models))
+    return [{"model": name, "T": t, "m": edges, "replicate": r, "seed": base_seed * 2 ** 32 + r}
+            for name in model_names for t in T for edges in m for r in range(replicates)]
+
+# Run the tasks of a sweep in a pool of workers processes (by default one per core), and append
+# their results to the results table at table_dir (see write_part) as they come in, every
+# flush_rows results. Tasks already in the table are skipped, so an interrupted sweep picks up
+# where it stopped, and more replicates can be added later.
+# With bootstraps > 0 every fit is tested for goodness of fit (p), which takes that many more fits;
+# with compare False the likelihood ratio comparisons are skipped.
+def run_sweep(tasks, table_dir, workers=None, bootstraps=0, compare=True, flush_rows=1000):
+    done = set()
+    if os.path.isdir(table_dir):
+        results = load_results(table_dir)
+        done = set(zip(*(results[column].tolist() for column in key_columns)))
+    tasks = [dict(task, bootstraps=bootstraps, compare=compare) for task in tasks if tuple(task[column] for column in key_columns) not in done]
+    print("Running", len(tasks), "tasks,", len(done), "already in", table_dir)
+    if not tasks:
+        return
+
+    rows = []
+    start = time.time()
+    workers = workers or os.cpu_count() or 1
+    pool = mp.get_context().Pool(workers) if workers > 1 else None
+    try:
+        results = pool.imap_unordered(run_task, tasks, chunksize=max(1, min(64, len(tasks) // (4 * workers)))) if pool else map(run_task, tasks)
+        for i, row in enumerate(results):
+            rows.append(row)
+            if len(rows) >= flush_rows or i == len(tasks) - 1:
+                write_part(table_dir, rows)
+                rows = []
+                print("Finished", i + 1, "of", len(tasks), "tasks in", round(time.time() - start, 1), "seconds")
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+# Generate the graph of a task and fit a power law to its degrees. Returns the row of the task.
+def run_task(task):
+    degrees = models[task["model"]](task["T"], task["m"], task["seed"])
+    row = {column: task[column] for column in key_columns}
+    row["max_degree"] = int(degrees.max())
+    row["mean_degree"] = float(degrees.mean())
+    try:
+        fit = powerlaw_fit.fit_power_law(degrees)
+    except ValueError:
+        row.update({column: np.nan for column in fit_columns if column not in row})
+        return row
+    row.update({column: fit[column] for column in ("alpha", "sigma", "xmin", "ks", "n_tail")})
+    row["p"] = powerlaw_fit.goodness_of_fit(degrees, fit, task["bootstraps"], workers=1, seed=task["seed"])["p"] if task["bootstraps"] else np.nan
+    comparisons = powerlaw_fit.compare_distributions(degrees, fit) if task["compare"] else {}
+    for name in ("lognormal", "exponential"):
+        row[name + "_R"] = comparisons[name]["R"] if comparisons else np.nan
+        row[name + "_p"] = comparisons[name]["p"] if comparisons else np.nan
+    return row
+
+# Append rows to the results table at table_dir: a directory of parts, each an .npz file with one
+# array per column (like the CSR graphs of csr_graph.py), written through a temporary file so that
+# readers never see a partial one.
+def write_part(table_dir, rows):
+    os.makedirs(table_dir, exist_ok=True)
+    columns = {column: np.array([row[column] for row in rows]) for column in key_columns + fit_columns}
+    path = os.path.join(table_dir, "part-%d-%d.npz" % (time.time_ns(), os.getpid()))
+    with open(path + ".tmp", "wb") as f:
+        np.savez(f, **columns)
+    os.replace(path + ".tmp", path)
+
+# Load the results table at table_dir as a dict of column name -> array, sorted by task.
+def load_results(table_dir):
+    parts = sorted(entry.path for entry in os.scandir(table_dir) if entry.name.endswith(".npz"))
+    columns = {column: [] for column in key_columns + fit_columns}
+    for part in parts:
+        with np.load(part, allow_pickle=False) as arrays:
+            for column in columns:
+                columns[column].append(arrays[column])
+    results = {column: np.concatenate(arrays) if arrays else np.zeros(0) for column, arrays in columns.items()}
+    order = np.lexsort([results[column] for column in reversed(key_columns)]) if parts else np.zeros(0, dtype=np.int64)
+    return {column: array[order] for column, array in results.items()}
+
+# Summarize the fitted exponents of every (model, T, m) group of the results: the number of
+# replicates, and the mean, standard deviation and standard error of the mean of alpha (over the
+# replicates where a power law could be fitted).
+def summarize(results):
+    groups = []
+    keys = sorted(set(zip(results["model"].tolist(), results["T"].tolist(), results["m"].tolist())))
+    for model, T, m in keys:
+        alpha = results["alpha"][(results["model"] == model) & (results["T"] == T) & (results["m"] == m)]
+        alpha = alpha[np.isfinite(alpha)]
+        std = float(alpha.std(ddof=1)) if len(alpha) > 1 else 0.0
+        groups.append({"model": model, "T": T, "m": m, "replicates": len(alpha), "alpha": alpha,
+                       "mean": float(alpha.mean()) if len(alpha) else np.nan, "std": std, "stderr": std / np.sqrt(max(len(alpha), 1))})
+    return groups
+
+# Plot the results table at table_dir to a PDF: the mean fitted alpha against T for every model
+# and m, with the standard deviation of the replicates, then the histogram of the estimates of
+# every model and m for every T.
+def plot_sweep(table_dir, pdf_file):
+    groups = summarize(load_results(table_dir))
+    for group in groups:
+        print(group["model"], "T =", group["T"], "m =", group["m"], ":", group["replicates"], "replicates, alpha =", round(group["mean"], 3), "+/-", round(group["stderr"], 3), "(std", round(group["std"], 3), ")")
+    pdf = PdfPages(pdf_file)
+
+    # Mean alpha against T
+    plt.figure(figsize=(12, 8))
+    series = sorted(set((group["model"], group["m"]) for group in groups))
+    for model, m in series:
+        points = [group for group in groups if group["model"] == model and group["m"] == m]
+        plt.errorbar([group["T"] for group in points], [group["mean"] for group in points], yerr=[group["std"] for group in points],
+                     marker='o', capsize=4, label=model.replace("_", " ").title() + " (m=" + str(m) + ")")
+    plt.xscale("log")
+    plt.legend()
+    plt.xlabel("Number of nodes T (log scale)")
+    plt.ylabel("Fitted power law exponent alpha (mean +/- std over replicates)")
+    plt.title("Tail exponent of the degree distribution")
+    pdf.savefig()
+    plt.close()
+
+    # Histograms of the estimates
+    for model, m in series:
+        plt.figure(figsize=(12, 8))
+        for group in groups:
+            if group["model"] == model and group["m"] == m and group["replicates"]:
+                plt.hist(group["alpha"], bins=30, alpha=0.5, label="T=" + str(group["T"]) + " (" + str(group["replicates"]) + " replicates)")
+        plt.legend()
+        plt.xlabel("Fitted power law exponent alpha")
+        plt.ylabel("Number of replicates")
+        plt.title("Estimates of alpha for the " + model.replace("_", " ").title() + " (m=" + str(m) + ")")
+        pdf.savefig()
+        plt.close()
+    pdf.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,18 @@
-import random
-import pickle
+import os
+import sys
 import numpy as np
 import networkx as nx
 import matplotlib.pyplot as plt
 from scipy.stats import linregress
 from matplotlib.backends.backend_pdf import PdfPages
 
+# Use the graph file helpers of the web-crawling project
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "web-crawling"))
+import csr_graph
+from layout_cache import get_layout
+from render import draw_graph
+import powerlaw_fit
+
 # Main function to conduct the experiment and generate the visualizations.
 def main():
     # Create a PDF file for saving the plots
@@ -14,14 +21,14 @@ def main():
     # Conduct the experiment for 3 different instances with the same parameters for better analysis
     for i in range(0, 3):
         # Generate the graphs
-        pam, degrees = generate_preferential_attachment_graph(300, "out/preferential_attachment_"+str(i+1)+".pkl")
-        config = generate_configuration_model_graph(degrees, "out/configuration_model_"+str(i+1)+".pkl")
+        pam, degrees = generate_preferential_attachment_graph(300, "out/preferential_attachment_"+str(i+1)+".csr")
+        config = generate_configuration_model_graph(degrees, "out/configuration_model_"+str(i+1)+".csr")
         graphs = [pam, config]
         titles = ["Preferential Attachment Model "+str(i+1)+" (T=300)", "Configuration Model "+str(i+1)+" (with Same Degree Distribution)"]
 
         # Plot the Frequency Plot and Rank Plot of the 2 graphs
         for i in range(len(graphs)):
-            plot_freq_and_rank([graphs[i].degree(node) for node in graphs[i].nodes()], titles[i], pdf)
+            plot_freq_and_rank([graphs[i].degree(node) for node in graphs[i].nodes()], titles[i], pdf, bootstraps=100)
 
         # Visualize the graphs in different ways
         for i in range(len(graphs)):
@@ -32,28 +39,20 @@ def main():
     pdf.close()
 
 # Generate an undirected Preferential Attachment graph with T nodes.
-# Return the graph, a list of degrees of the nodes, and optionally save it to a file if specified.
-# If T < 2, print an error message and return None.
-def generate_preferential_attachment_graph(T, save_file=None):
+# Starting from 2 connected nodes, every new node attaches m edges to existing nodes chosen
+# with probability proportional to their degree. A node picked twice by the same new node gets a
+# single edge in the graph, but both picks count towards its weight in later picks.
+# Return the graph, a numpy array of degrees of the nodes, and optionally save it to a file if specified.
+# If T < 2, print an error message and return None. Pass a seed for a reproducible graph.
+def generate_preferential_attachment_graph(T, save_file=None, m=1, seed=None):
     if (T < 2):
         print("Error: T must be at least 2.")
         return None
     
-    # Create a new graph with 2 nodes connected by an edge
+    # Create a new graph from the edges, which connect the nodes in order 0, 1, 2, ...
+    edges = preferential_attachment_edges(T, m, seed)
     G = nx.Graph()
-    G.add_edge(0, 1)
-
-    while G.number_of_nodes() < T:
-        # Get all the nodes and weight them by their degree
-        nodes = list(G.nodes())
-        degrees = [G.degree(node) for node in G.nodes()]
-
-        # Choose a neighbor based on the degrees of all existing nodes
-        neighbor = random.choices(nodes, weights=degrees, k=1)[0]
-
-        # Add the new node and connect it to the selected neighbor
-        node_n = G.number_of_nodes()
-        G.add_edge(node_n, neighbor)
+    G.add_edges_from(edges.tolist())
 
     # Save the graph to a file
     if (save_file is not None):
@@ -62,29 +61,95 @@ def generate_preferential_attachment_graph(T, save_file=None):
     else:
         print("Preferential Attachment graph G, n=" +str(T)+ ", m=" +str(G.number_of_edges())+ " edges has been generated.")
 
-    # Return the graph and the list of degrees
-    return (G, [G.degree(node) for node in G.nodes()])
+    # Return the graph and the degrees
+    return (G, np.bincount(edges.ravel(), minlength=T))
+
+# Sample the edges of a Preferential Attachment graph with T nodes and m edges per new node
+# as an (edges, 2) array of (new node, existing node) pairs, in O(T * m) memory and near-linear time.
+# Picking a node with probability proportional to its degree is the same as picking a uniformly
+# random endpoint of the edges so far. Lay the endpoints of edge e out at positions 2e (its new
+# node, known up front) and 2e + 1 (the node it attaches to): a pick at an even position is then
+# resolved at once, and a pick at an odd position copies the choice of an earlier edge. All picks
+# are drawn at once, and the copies are resolved by pointer jumping in O(log T) vectorized rounds.
+def preferential_attachment_edges(T, m=1, seed=None):
+    rng = np.random.default_rng(seed)
+
+    # Edge 0 connects node 1 to node 0, and node t >= 2 adds edges 1 + m(t-2) ... m(t-1).
+    count = 1 + m * (T - 2)
+    source = np.empty(count, dtype=np.int64)
+    source[0] = 1
+    source[1:] = 2 + np.arange(count - 1) // m
+    first_edge = 1 + m * (source - 2)
+    first_edge[0] = 0
+
+    # Every edge of a new node picks one of the endpoints of the edges before the node's first.
+    picks = (rng.random(count) * (2 * first_edge)).astype(np.int64)
+    target = np.zeros(count, dtype=np.int64)
+    copy_of = np.full(count, -1, dtype=np.int64)
+    even = picks % 2 == 0
+    target[even] = source[picks[even] // 2]
+    copy_of[~even] = picks[~even] // 2
+    target[0] = 0
+
+    # Resolve the copies: take the target of the copied edge once it is resolved, and otherwise
+    # jump to whatever that edge copies.
+    pending = np.flatnonzero(copy_of >= 0)
+    while len(pending):
+        copied = copy_of[pending]
+        jump = copy_of[copied]
+        done = jump < 0
+        target[pending[done]] = target[copied[done]]
+        copy_of[pending] = jump
+        pending = pending[~done]
+
+    # Drop repeated picks of the same node by a new node, keeping the first.
+    edges = np.column_stack((source, target))
+    if m > 1:
+        _, first = np.unique(source * T + target, return_index=True)
+        edges = edges[np.sort(first)]
+    return edges
 
 # Generate an undirected Configuration Model graph according to the given degree sequence.
 # Return the graph and optionally save it to a file if specified.
+# Randomly matching the stubs can give self-loops and multi-edges, which the mode handles:
+#   "multigraph": keep them all in an nx.MultiGraph, so every node has exactly its degree.
+#   "erased":     drop them to get a simple nx.Graph, in which some nodes lose some degree.
+#   "rewire":     swap the endpoints of each of them with a random edge until the graph is
+#                 simple, which keeps every degree; any left after max_rounds rounds are erased.
+# The counts of self-loops and multi-edges found, edges rewired and edges erased are printed
+# and kept in G.graph["configuration_model"].
 # If the degree sequence is not valid, print an error message and return None.
-def generate_configuration_model_graph(deg_seq, save_file=None):
-    if (sum(deg_seq) % 2 != 0):
+# Pass a seed for a reproducible graph.
+def generate_configuration_model_graph(deg_seq, save_file=None, mode="erased", seed=None, max_rounds=100):
+    deg_seq = np.asarray(deg_seq, dtype=np.int64)
+    if (deg_seq.sum() % 2 != 0):
         print("Error: The sum of the degree sequence must be even.")
         return None
-    
-    # Create a new graph
-    G = nx.Graph()
-
-    # Create a list of stubs for each node based on its degree
-    stubs = [i for freqs in ([idx] * deg for idx, deg in enumerate(deg_seq)) for i in freqs]
-    
-    # Shuffle the stubs
-    random.shuffle(stubs)
+    if (len(deg_seq) > 0 and deg_seq.min() < 0):
+        print("Error: The degrees must not be negative.")
+        return None
+    if mode not in ("multigraph", "erased", "rewire"):
+        print("Error: The mode must be multigraph, erased or rewire.")
+        return None
 
-    # Create an edge between every pair of stubs in the shuffled order
-    for i in range(0, len(stubs), 2):
-        G.add_edge(stubs[i], stubs[i+1])
+    # Match the stubs at random and handle the self-loops and multi-edges
+    rng = np.random.default_rng(seed)
+    n = len(deg_seq)
+    edges = configuration_model_edges(deg_seq, rng)
+    stats = {"self_loops": int(np.count_nonzero(edges[:, 0] == edges[:, 1])), "multi_edges": int(np.count_nonzero(multi_edges(edges, n))), "rewired": 0, "erased": 0}
+    if mode == "rewire":
+        edges, stats["rewired"] = rewire_edges(edges, n, rng, max_rounds)
+    if mode != "multigraph":
+        simple = ~(multi_edges(edges, n) | (edges[:, 0] == edges[:, 1]))
+        stats["erased"] = int(len(edges) - np.count_nonzero(simple))
+        edges = edges[simple]
+
+    # Create a new graph with every node of the degree sequence
+    G = nx.MultiGraph() if mode == "multigraph" else nx.Graph()
+    G.add_nodes_from(range(n))
+    G.add_edges_from(edges.tolist())
+    G.graph["configuration_model"] = stats
+    print("Configuration Model stubs matched with", stats["self_loops"], "self-loops and", stats["multi_edges"], "multi-edges;", stats["rewired"], "edges rewired and", stats["erased"], "edges erased.")
     
     # Save the graph to a file
     if (save_file is not None):
@@ -96,9 +161,59 @@ def generate_configuration_model_graph(deg_seq, save_file=None):
     # Return the graph
     return G
 
+# Match the stubs of the degree sequence uniformly at random, returning the (m, 2) array of edges.
+def configuration_model_edges(deg_seq, rng):
+    # Node i has deg_seq[i] stubs, and a random permutation pairs them up two by two
+    stubs = np.repeat(np.arange(len(deg_seq), dtype=np.int64), deg_seq)
+    rng.shuffle(stubs)
+    return stubs.reshape(-1, 2)
+
+# Mark the edges that repeat an earlier edge between the same two nodes.
+def multi_edges(edges, n):
+    keys = np.minimum(edges[:, 0], edges[:, 1]) * n + np.maximum(edges[:, 0], edges[:, 1])
+    # Find the repeated keys with a plain sort, then only order the few edges that have them.
+    sorted_keys = np.sort(keys)
+    repeated_keys = np.unique(sorted_keys[1:][sorted_keys[1:] == sorted_keys[:-1]])
+    candidates = np.flatnonzero(np.isin(keys, repeated_keys))
+    repeated = np.zeros(len(edges), dtype=bool)
+    repeated[candidates] = True
+    repeated[candidates[np.unique(keys[candidates], return_index=True)[1]]] = False
+    return repeated
+
+# Rewire the self-loops and multi-edges: in rounds, swap the endpoints of every such edge (a, b)
+# with those of a randomly picked edge (c, d) to give (a, d) and (c, b), which keeps all degrees.
+# A swap is skipped if it would make a self-loop, and swaps that make a new multi-edge get fixed
+# in the next round. Stop when the graph is simple or after max_rounds rounds.
+# Return the edges and the number of swaps made.
+def rewire_edges(edges, n, rng, max_rounds=100):
+    edges = edges.copy()
+    swaps = 0
+    for _ in range(max_rounds):
+        bad = np.flatnonzero(multi_edges(edges, n) | (edges[:, 0] == edges[:, 1]))
+        if len(bad) == 0:
+            break
+        # Pair every bad edge with a random edge, using each edge in at most one swap per round.
+        partners = rng.integers(0, len(edges), len(bad))
+        keep = ~np.isin(partners, bad)
+        bad, partners = bad[keep], partners[keep]
+        partners, first = np.unique(partners, return_index=True)
+        bad = bad[first]
+        # Swap unless it would make a self-loop.
+        a, b = edges[bad, 0], edges[bad, 1]
+        c, d = edges[partners, 0], edges[partners, 1]
+        ok = (a != d) & (c != b)
+        edges[bad[ok], 1] = d[ok]
+        edges[partners[ok], 1] = b[ok]
+        swaps += int(np.count_nonzero(ok))
+    return edges, swaps
+
 # Plot the Frequency Plot and Rank Plot of the data and save it to a PDF.
 # Alternatively, outputs the plots if no PDF file is given.
-def plot_freq_and_rank(data, title, pdf_pages=None):
+# The rank plot shows the discrete power law fitted to the tail of the data by powerlaw_fit.py.
+# With bootstraps > 0 the fit is also tested for goodness of fit with that many synthetic data sets.
+# Returns the fit, with the goodness of fit p-value (None without bootstraps) and the likelihood
+# ratio comparisons against the lognormal and exponential distributions.
+def plot_freq_and_rank(data, title, pdf_pages=None, bootstraps=0, seed=None):
     print("Visualizing", title)
 
     # Sort the data in ascending order
@@ -110,14 +225,17 @@ def plot_freq_and_rank(data, title, pdf_pages=None):
     # Compute the LOB for the frequency plot
     mf, bf, rf, _, _ = linregress(data, ecdf)
 
-    # Compute the LOB for rank plot
-    x = np.array(data)
-    y = np.array(1-ecdf)
-    log_x = np.log(x)
-    log_y = np.log(y + 1e-12)
-    mr, br, rr, _, _ = linregress(log_x, log_y)
-    # Convert back to original scale
-    fit_y = np.exp(br) * x**mr  # y = exp(intercept) * x^slope
+    # Fit a power law to the tail for the rank plot
+    fit = powerlaw_fit.fit_power_law(data)
+    fit["p"] = powerlaw_fit.goodness_of_fit(data, fit, bootstraps, seed=seed)["p"] if bootstraps else None
+    fit["comparisons"] = powerlaw_fit.compare_distributions(data, fit)
+    fit_x = np.unique(data[data >= fit["xmin"]])
+    fit_y = powerlaw_fit.power_law_ccdf(fit, fit_x)
+    print("Power law fit: alpha =", round(fit["alpha"], 3), "+/-", round(fit["sigma"], 3), "for x >=", fit["xmin"], "(" + str(fit["n_tail"]), "of", fit["n"], "values), KS distance =", round(fit["ks"], 4))
+    if fit["p"] is not None:
+        print("    goodness of fit p =", round(fit["p"], 3), "over", bootstraps, "bootstraps")
+    for name, comparison in fit["comparisons"].items():
+        print("    vs", name + ": R =", round(comparison["R"], 3), "p =", round(comparison["p"], 3))
 
     # Make the frequency plot
     plt.figure(figsize=(12,13))
@@ -137,7 +255,7 @@ def plot_freq_and_rank(data, title, pdf_pages=None):
     # Make the rank plot
     plt.figure(figsize=(12,13))
     plt.loglog(data, 1- ecdf, marker='o', label="Log-Log Rank Distribution")
-    plt.loglog(x, fit_y, label=f"Best Fit: y = {np.exp(br):.2f}x^{mr:.2f} with R^2={rr**2:.2f}")
+    plt.loglog(fit_x, fit_y, label=f"Power Law MLE: alpha = {fit['alpha']:.2f} for x >= {fit['xmin']} with KS distance {fit['ks']:.3f}")
     plt.legend(loc="upper right")
     plt.xlabel("Value (log scale)")
     plt.ylabel("Probability of having more than x (log scale)")
@@ -147,6 +265,7 @@ def plot_freq_and_rank(data, title, pdf_pages=None):
     else:
         pdf_pages.savefig()
     plt.close()
+    return fit
 
 # Make a grid of 6 different visualizations of the graph and save it to a PDF.
 def variety_visualize_graph(G, title, pdf_pages, with_labels=True, font_size=14, node_size=20):
@@ -157,35 +276,35 @@ def variety_visualize_graph(G, title, pdf_pages, with_labels=True, font_size=14,
 
     # Spring layout
     plt.subplot(6, 1, 1)
-    nx.draw(G, with_labels=with_labels, font_size=font_size, node_size=node_size, font_color='r', pos=nx.spring_layout(G))
+    draw_graph(G, with_labels=with_labels, font_size=font_size, node_size=node_size, font_color='r', pos=get_layout(G))
     plt.title("Spring layout")
 
     # Random layout
     plt.subplot(6, 1, 2)
-    nx.draw(G, with_labels=with_labels, font_size=font_size, node_size=node_size, font_color='r',pos=nx.random_layout(G))
+    draw_graph(G, with_labels=with_labels, font_size=font_size, node_size=node_size, font_color='r',pos=get_layout(G, "random"))
     plt.title("Random layout")
 
     # Circular layout
     plt.subplot(6, 1, 3)
-    nx.draw(G, with_labels=with_labels, font_size=font_size, node_size=node_size, font_color='r',pos=nx.circular_layout(G))
+    draw_graph(G, with_labels=with_labels, font_size=font_size, node_size=node_size, font_color='r',pos=get_layout(G, "circular"))
     plt.title("Circular layout")
 
     # Shell layout
     plt.subplot(6, 1, 4)
-    nx.draw(G, with_labels=with_labels, font_size=font_size, node_size=node_size, font_color='r',pos=nx.shell_layout(G))
+    draw_graph(G, with_labels=with_labels, font_size=font_size, node_size=node_size, font_color='r',pos=get_layout(G, "shell"))
     plt.title("Shell layout")
 
     # Planar layout
     plt.subplot(6, 1, 5)
     try:
-        nx.draw(G, with_labels=with_labels, font_size=font_size, node_size=node_size, font_color='r', pos=nx.planar_layout(G))
+        draw_graph(G, with_labels=with_labels, font_size=font_size, node_size=node_size, font_color='r', pos=get_layout(G, "planar"))
     except: 
         plt.text(0.5, 0.5, "Layout not possible (G is not planar)", horizontalalignment='center', verticalalignment='center', transform=plt.gca().transAxes)
     plt.title("Planar layout")
 
     # Spectral layout
     plt.subplot(6, 1, 6)
-    nx.draw(G, with_labels=with_labels, font_size=font_size, node_size=node_size, font_color='r', pos=nx.spectral_layout(G))
+    draw_graph(G, with_labels=with_labels, font_size=font_size, node_size=node_size, font_color='r', pos=get_layout(G, "spectral"))
     plt.title("Spectral layout")
 
     # Give a title to the entire figure
@@ -205,15 +324,14 @@ def visualize_degree_scaled_graph(G, title, pdf_pages, with_labels=True):
     # Generate the figure
     plt.figure(figsize=(12, 13))
     plt.title(title, fontsize=20)
-    nx.draw(G, node_size=node_sizes, node_color="lightblue", edgecolors="black", linewidths=2, with_labels=with_labels, pos=nx.spring_layout(G))
+    draw_graph(G, node_size=node_sizes, node_color="lightblue", edgecolors="black", linewidths=2, with_labels=with_labels, pos=get_layout(G))
 
     pdf_pages.savefig()  
     plt.close()  
 
-# Simply save the graph to a file.
+# Simply save the graph to a file, in CSR format if it ends in .csr and pickled otherwise.
 def save_graph(G, save_file):
-    with open(save_file, "wb") as f:
-        pickle.dump(G, f)
+    csr_graph.save_graph(G, save_file)
     
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,142 @@
+import os
+import sys
+import time
+import resource
+import importlib.util
+import multiprocessing as mp
+import numpy as np
+import networkx as nx
+from urllib.error import URLError
+import crawl
+import fetcher3
+import synthetic_site
+
+def main():
+    # Benchmark the crawler on a 2000 page site shaped like a preferential attachment graph,
+    # with 5 ms of latency per page, pages of 20 KB, and 1% of the pages failing.
+    G = web_graph("preferential-attachment", 2000)
+    run_benchmarks(G, 2000, latency=0.005, page_bytes=20000, error_rate=0.01)
+
+# Benchmark fetch_links, crawl and crawl_async against a synthetic site serving the graph G
+# (see synthetic_site.py) with the given latency, page size and error rate.
+# Every benchmark runs in a fresh process, so they do not share connections or cached validators
+# and the peak RSS is that of the benchmark alone. For each one, print and return the number of
+# pages fetched, pages/s, bytes/s, the median and 99th percentile fetch latency, and the peak RSS.
+def run_benchmarks(G, limit, latency=0.0, page_bytes=0, error_rate=0.0, seed=0, concurrency=16):
+    server, base_url = synthetic_site.serve_graph(G, latency=latency, page_bytes=page_bytes, error_rate=error_rate, seed=seed)
+    start_url = synthetic_site.page_url(base_url, 0)
+    domain = server.server_address[0]
+    urls = [synthetic_site.page_url(base_url, i) for i in range(min(limit, G.number_of_nodes()))]
+    benchmarks = [
+        ("fetch_links", benchmark_fetch_links, (urls,)),
+        ("crawl", benchmark_crawl, ("crawl", start_url, limit, domain, {})),
+        ("crawl_async", benchmark_crawl, ("crawl_async", start_url, limit, domain, {"concurrency": concurrency})),
+    ]
+
+    print("Benchmarking on a site of", G.number_of_nodes(), "pages with", latency * 1000, "ms latency,", page_bytes, "byte pages and a", error_rate, "error rate.")
+    results = []
+    try:
+        for name, benchmark, args in benchmarks:
+            bytes_before = server.bytes_sent
+            result = run_in_process(benchmark, args)
+            result["name"] = name
+            result["bytes"] = server.bytes_sent - bytes_before
+            result["bytes_per_s"] = result["bytes"] / result["seconds"]
+            print("%-12s %6d pages in %6.2f s: %8.1f pages/s %8.2f MB/s, latency p50 %7.2f ms p99 %7.2f ms, peak RSS %7.1f MB" % (
+                name, result["pages"], result["seconds"], result["pages_per_s"], result["bytes_per_s"] / 1e6,
+                result["p50_ms"], result["p99_ms"], result["peak_rss_mb"]))
+            results.append(result)
+    finally:
+        synthetic_site.stop_site(server)
+    return results
+
+# Generate the graph of a synthetic site from a graph model: "preferential-attachment" (the
+# undirected model of heavy-tailed/tools.py) or "scale-free" (a directed web-like graph).
+def web_graph(model, n, seed=0):
+    if model == "preferential-attachment":
+        G, degrees = heavy_tailed_tools().generate_preferential_attachment_graph(n, seed=seed)
+        return G
+    if model == "scale-free":
+        return nx.DiGraph(nx.scale_free_graph(n, seed=seed))
+    raise ValueError("unknown graph model " + repr(model) + ", expected preferential-attachment or scale-free")
+
+# Load heavy-tailed/tools.py, which cannot be imported by name next to this directory's tools.py.
+def heavy_tailed_tools():
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "heavy-tailed", "tools.py")
+    spec = importlib.util.spec_from_file_location("heavy_tailed_tools", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+# Run a benchmark in a new process and return its statistics.
+def run_in_process(benchmark, args):
+    ctx = mp.get_context("spawn")
+    results = ctx.Queue()
+    process = ctx.Process(target=measure, args=(benchmark, args, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+# Run a benchmark, which returns the number of pages it fetched, the time it took and the
+# latency of every fetch, and put its statistics on the results queue.
+def measure(benchmark, args, results):
+    # Keep the crawler's progress output out of the report.
+    sys.stdout = open(os.devnull, "w")
+    pages, seconds, latencies = benchmark(*args)
+    latencies = np.array(latencies) * 1000
+    results.put({
+        "pages": pages,
+        "seconds": seconds,
+        "pages_per_s": pages / seconds,
+        "p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+        "p99_ms": float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+        "peak_rss_mb": peak_rss() / (1024 * 1024),
+    })
+
+# Get the peak resident set size of this process in bytes.
+# On Linux, ru_maxrss survives exec and so includes the parent the process was started from, so
+# the high water mark of the process's own memory is read from /proc instead.
+def peak_rss():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+# Fetch the links of every url one after the other.
+def benchmark_fetch_links(urls):
+    latencies = []
+    start = time.perf_counter()
+    for url in urls:
+        fetch_start = time.perf_counter()
+        try:
+            fetcher3.fetch_links(url)
+        except URLError:
+            pass
+        latencies.append(time.perf_counter() - fetch_start)
+    return len(urls), time.perf_counter() - start, latencies
+
+# Crawl the site with the named crawl function of crawl.py, timing every fetch it makes.
+def benchmark_crawl(function, start_url, limit, domain, options):
+    latencies = []
+    fetch_links = crawl.fetch_links
+
+    def timed_fetch_links(url):
+        fetch_start = time.perf_counter()
+        try:
+            return fetch_links(url)
+        finally:
+            latencies.append(time.perf_counter() - fetch_start)
+
+    crawl.fetch_links = timed_fetch_links
+    start = time.perf_counter()
+    getattr(crawl, function)(start_url, limit, domain=domain, **options)
+    return len(latencies), time.perf_counter() - start, latencies
+
+if __name__ == "__main__":
+    main()
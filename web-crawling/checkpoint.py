@@ -0,0 +1,69 @@
+import os
+import json
+from frontier import in_scope
+
+# Append-only checkpoint of a crawl.
+# The first line is a header with the crawl parameters. Every following line records one page
+# in the order its result was committed to the graph: the links found on it (restricted to the
+# crawled domain), null if it was not an HTML page, or an error flag if the fetch failed.
+# Replaying these records through the crawler's commit step rebuilds the graph, the visited set
+# and the frontier exactly, so a resumed crawl never re-fetches a page that was recorded.
+class CrawlCheckpoint:
+    def __init__(self, path, header=None, every=50):
+        self.path = path
+        self.every = every
+        self.pending = []
+        # Start a new checkpoint if a header is given, else append to the existing one
+        # after dropping any partially written final line.
+        if header is None:
+            with open(path, "rb+") as f:
+                data = f.read()
+                f.truncate(data.rfind(b"\n") + 1)
+        self.file = open(path, "w" if header is not None else "a", encoding="utf-8")
+        if header is not None:
+            self.pending.append(json.dumps(header))
+            self.flush()
+
+    # Record the result of visiting a page: its links, None for non-HTML pages, or an error.
+    def record(self, url, links, domain, error=False):
+        if error:
+            entry = {"url": url, "error": True}
+        elif links is None:
+            entry = {"url": url, "links": None}
+        else:
+            entry = {"url": url, "links": [link for link in links if in_scope(link, domain)]}
+        self.pending.append(json.dumps(entry))
+
+        # Periodically push the buffered records to disk.
+        if len(self.pending) >= self.every:
+            self.flush()
+
+    # Write the buffered records and make sure they reach the disk.
+    def flush(self):
+        if not self.pending:
+            return
+        self.file.write("\n".join(self.pending) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = []
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+# Load a checkpoint, returning its header and the list of page records in commit order.
+# A partially written final line (from a crash mid-write) is ignored.
+def load_checkpoint(path):
+    with open(path, "r", encoding="utf-8") as f:
+        lines = f.read().split("\n")
+    header = json.loads(lines[0])
+    records = []
+    for i, line in enumerate(lines[1:], start=1):
+        if not line:
+            continue
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            if i < len(lines) - 1 and any(lines[i+1:]):
+                raise
+    return header, records
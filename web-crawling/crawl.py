@@ -1,13 +1,27 @@
 from fetcher3 import fetch_links
-import networkx as nx
-import pickle
+from checkpoint import CrawlCheckpoint, load_checkpoint
+from crawl_state import CrawlState
+from politeness import PolitenessScheduler
+from sharded_crawl import crawl_sharded
+from csr_graph import save_graph
+import asyncio
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from urllib.error import URLError
+from urllib.parse import urlsplit
+
+# Whether main spreads the crawl over one process per core with crawl_sharded (see
+# sharded_crawl.py), for when parsing pages is the bottleneck. Sharded crawls cannot be
+# checkpointed or streamed to an edge log.
+sharded = False
 
 def main():
     # Start crawling from the Caltech homepage and limit the number of pages to 100.
     start_url = "http://www.caltech.edu"
-    crawl(start_url, 2000, "caltech_graph_2000.pkl")
+    if sharded:
+        crawl_sharded(start_url, 2000, "caltech_graph_2000.csr", polite_rate=2.0)
+    else:
+        crawl_async(start_url, 2000, "caltech_graph_2000.csr", checkpoint_file="caltech_graph_2000.checkpoint", politeness=PolitenessScheduler(rate=2.0), edge_log_file="caltech_graph_2000.edges.gz")
 
 # Crawl the web starting from the given URL and stop after visiting the given number of pages.
 # Selection policy:
@@ -27,63 +41,212 @@ def main():
         # - Misses any links within multimedia/data files.
         # - Misses any links that are not in the HTML source code.
         # - Misses any new or changed links that are added after each page is visited.
-def crawl(start_url, limit, save_file = None):
-    # Initialize the graph, the queue of URLs to visit, and the set of already visited URLs.
-    graph = nx.DiGraph()
-    graph.add_node(start_url)
-    url_queue = deque([start_url])
-    visited = set()
-
-    # Crawl until the queue is empty.
-    while url_queue:
-        # Get the next url from the queue.
-        current_url = url_queue.popleft()
+# The policy picks the frontier that orders the urls to visit ("bfs", "round-robin", "opic" or
+# "depth" with max_depth, see frontier.py), and urls are only crawled if their host is within
+# the domain (or one of a list of domains).
+# If a PolitenessScheduler is given, robots.txt is obeyed and requests to each host are rate limited.
+# If an edge log file is given, nodes and edges are streamed to it as they are found instead of
+# being kept in memory (see edge_log.py), and the graph is only built at the end if it is saved.
+def crawl(start_url, limit, save_file = None, domain = ".caltech.edu", checkpoint_file = None, policy = "bfs", max_depth = None, politeness = None, edge_log_file = None):
+    # Initialize the url table, the graph, the frontier of URLs to visit, and the set of already visited URLs.
+    state = CrawlState(start_url, limit, domain, policy, max_depth, edge_log_file)
+
+    # Periodically checkpoint the crawl if a checkpoint file is specified.
+    checkpoint = new_checkpoint(checkpoint_file, start_url, limit, domain, policy, max_depth, edge_log_file)
+    try:
+        crawl_pages(state, checkpoint, politeness)
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+        state.close()
+
+    return finish_crawl(state, save_file)
+
+# Visit the pages in the frontier one at a time until it is empty, growing the graph.
+def crawl_pages(state, checkpoint = None, politeness = None):
+    graph, frontier, visited = state.graph, state.frontier, state.visited
+
+    # Crawl until the frontier is empty.
+    while frontier:
+        # Get the next url from the frontier.
+        current = frontier.pop()
 
         # Skip if current url has already been visited, else mark it visited for next time.
-        if current_url in visited:
+        if current in visited:
             continue
-        visited.add(current_url)
+        visited.add(current)
+        current_url = state.table.url(current)
 
         # Try to fetch the hyperlinks in the current page.
         print("n =", graph.number_of_nodes(), "m =", graph.number_of_edges(), "visited", len(visited), "pages, visiting", current_url)
         try:
             # Ignores non-html pages and parameters in dynamic URLs 
-            links = fetch_links(current_url)
+            links = polite_fetch_links(current_url, politeness)
         except (KeyboardInterrupt, URLError): 
             # Removes the node if there is an error during the fetch.
             print("KeyboardInterrupt or URLError on ", current_url)
-            graph.remove_node(current_url)
+            graph.remove_node(current)
+            if checkpoint is not None:
+                checkpoint.record(current_url, None, state.domain, error=True)
             continue 
+        if checkpoint is not None:
+            checkpoint.record(current_url, links, state.domain)
         
         # Continue to next url if no hyperlinks are found.
         if links is None:
             continue
 
         # Add the hyperlinks to the graph.
-        for link in links:
-            # Skip if the current url is not in the Caltech domain.
-            if (link.find(".caltech.edu") == -1):
-                continue
-        
-            if graph.number_of_nodes() < limit:
-                # Make new node and add edge between existing node and new node.
-                graph.add_node(link)
-                graph.add_edge(current_url, link)
-                # Add the hyperlink to the list of next visits if it is not visited yet.
-                if link not in visited:
-                    url_queue.append(link)
-            else: 
-                # Only add edges between existing nodes (from this point, no new nodes are added).
-                if link not in graph:
+        state.add_links(current, links)
+
+# Crawl the web like crawl(), but keep up to `concurrency` fetches in flight at once, with at
+# most `per_host` of them against any single host.
+# Up to `window` pages (4 * concurrency by default) are taken from the frontier ahead of time, so
+# pages of other hosts keep being fetched while one host is throttled by the politeness scheduler.
+# Their links are committed to the graph strictly in the order the pages were taken, so with the
+# BFS policy node admission and the limit behave exactly as in the sequential crawl and the same
+# graph is produced.
+def crawl_async(start_url, limit, save_file = None, domain = ".caltech.edu", concurrency = 16, per_host = 4, checkpoint_file = None, policy = "bfs", max_depth = None, politeness = None, window = None, edge_log_file = None):
+    # Initialize the url table, the graph, the frontier of URLs to visit, and the set of already visited URLs.
+    state = CrawlState(start_url, limit, domain, policy, max_depth, edge_log_file)
+
+    # Periodically checkpoint the crawl if a checkpoint file is specified.
+    checkpoint = new_checkpoint(checkpoint_file, start_url, limit, domain, policy, max_depth, edge_log_file)
+    try:
+        asyncio.run(crawl_pages_async(state, concurrency, per_host, checkpoint, politeness, window))
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+        state.close()
+
+    return finish_crawl(state, save_file)
+
+# Visit the pages in the frontier with several fetches in flight until it is empty, growing the graph.
+async def crawl_pages_async(state, concurrency, per_host, checkpoint = None, politeness = None, window = None):
+    graph, frontier, visited = state.graph, state.frontier, state.visited
+    window = window or 4 * concurrency
+
+    # Fetches run on a thread pool (fetch_links is blocking), gated by a semaphore per host and
+    # one for the whole crawl.
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    host_slots = {}
+    fetch_slots = asyncio.Semaphore(concurrency)
+
+    async def fetch(url):
+        slot = host_slots.setdefault(urlsplit(url).netloc, asyncio.Semaphore(per_host))
+        async with slot:
+            # Wait for the host's turn without holding up fetches from other hosts.
+            if politeness is not None:
+                allowed, delay = await loop.run_in_executor(executor, politeness.reserve, url)
+                if not allowed:
+                    return None
+                await asyncio.sleep(delay)
+            async with fetch_slots:
+                return await loop.run_in_executor(executor, fetch_links, url)
+
+    # Fetches in flight, in the order their urls were taken from the frontier.
+    in_flight = deque()
+    try:
+        while frontier or in_flight:
+            # Top up the window of in-flight fetches from the frontier.
+            while frontier and len(in_flight) < window:
+                url_id = frontier.pop()
+                if url_id in visited:
                     continue
-                graph.add_edge(current_url, link)
-    print("Successfully crawled", len(visited), "pages, producing a graph with n =", graph.number_of_nodes(), "nodes and m =", graph.number_of_edges(), "edges.")
+                visited.add(url_id)
+                in_flight.append((url_id, asyncio.ensure_future(fetch(state.table.url(url_id)))))
+            if not in_flight:
+                continue
+
+            # Wait for the oldest fetch so results are committed in the order of the frontier.
+            current, task = in_flight.popleft()
+            current_url = state.table.url(current)
+            print("n =", graph.number_of_nodes(), "m =", graph.number_of_edges(), "visited", len(visited), "pages, visiting", current_url)
+            try:
+                links = await task
+            except URLError:
+                # Removes the node if there is an error during the fetch.
+                print("URLError on ", current_url)
+                graph.remove_node(current)
+                if checkpoint is not None:
+                    checkpoint.record(current_url, None, state.domain, error=True)
+                continue
+            if checkpoint is not None:
+                checkpoint.record(current_url, links, state.domain)
+
+            # Continue to next url if no hyperlinks are found.
+            if links is None:
+                continue
+
+            # Add the hyperlinks to the graph.
+            state.add_links(current, links)
+    finally:
+        for _, task in in_flight:
+            task.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+# Resume a crawl from its checkpoint file and continue it to completion.
+# The recorded pages are replayed without being fetched again, rebuilding the graph, the
+# visited set and the queue, and new pages keep being appended to the same checkpoint.
+# A concurrency of 1 continues with the sequential crawler, anything else with crawl_async.
+# If the crawl had an edge log, it is rewritten from the start by the replay.
+def resume(checkpoint_file, save_file = None, concurrency = 16, per_host = 4, politeness = None):
+    header, records = load_checkpoint(checkpoint_file)
+    start_url = header["start_url"]
+
+    # Replay the recorded pages through the same steps the crawler used to commit them.
+    state = CrawlState(start_url, header["limit"], header["domain"], header.get("policy", "bfs"), header.get("max_depth"), header.get("edge_log_file"))
+    for record in records:
+        current = state.table.intern(record["url"])
+        state.visited.add(current)
+        if record.get("error"):
+            state.graph.remove_node(current)
+        elif record["links"] is not None:
+            state.add_links(current, record["links"])
+    print("Resumed crawl of", start_url, "from", checkpoint_file, "with", len(state.visited), "visited pages, n =", state.graph.number_of_nodes(), "m =", state.graph.number_of_edges())
+
+    # Continue crawling, appending to the existing checkpoint.
+    checkpoint = CrawlCheckpoint(checkpoint_file)
+    try:
+        if concurrency == 1:
+            crawl_pages(state, checkpoint, politeness)
+        else:
+            asyncio.run(crawl_pages_async(state, concurrency, per_host, checkpoint, politeness))
+    finally:
+        checkpoint.close()
+        state.close()
+
+    return finish_crawl(state, save_file)
+
+# Fetch the links of a page like fetch_links, first waiting for the host's turn if a politeness
+# scheduler is given. Pages disallowed by robots.txt are treated like non-HTML pages (no links).
+def polite_fetch_links(url, politeness):
+    if politeness is not None and not politeness.wait(url):
+        return None
+    return fetch_links(url)
+
+# Start a new checkpoint for a crawl, or return None if no checkpoint file is specified.
+def new_checkpoint(checkpoint_file, start_url, limit, domain, policy, max_depth, edge_log_file):
+    if checkpoint_file is None:
+        return None
+    return CrawlCheckpoint(checkpoint_file, {"start_url": start_url, "limit": limit, "domain": domain, "policy": policy, "max_depth": max_depth, "edge_log_file": edge_log_file})
+
+# Report the crawl, build its graph from the url ids, and save it to a file if a save file is specified.
+# A crawl with an edge log already has its graph on disk, so without a save file it returns None.
+def finish_crawl(state, save_file):
+    if state.edge_log is not None and not save_file:
+        print("Successfully crawled", len(state.visited), "pages, producing a graph with n =", state.graph.number_of_nodes(), "nodes and m =", state.graph.number_of_edges(), "edges.")
+        print("Graph logged to ", state.edge_log.path)
+        return None
+    graph = state.to_networkx()
+    print("Successfully crawled", len(state.visited), "pages, producing a graph with n =", graph.number_of_nodes(), "nodes and m =", graph.number_of_edges(), "edges.")
 
-    # Save the graph to a file if a save file is specified.
+    # Save the graph to a file (in CSR format if it ends in .csr) if a save file is specified.
     if save_file:
-        with open(save_file, "wb") as f:
-            pickle.dump(graph, f)
+        save_graph(graph, save_file)
     print("Graph saved to ", save_file)
+    return graph
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
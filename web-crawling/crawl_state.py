@@ -0,0 +1,192 @@
+from array import array
+import networkx as nx
+from frontier import in_scope, new_frontier
+from edge_log import EdgeLog, load_edge_log
+
+# Maps urls to dense integer ids (0, 1, 2, ...) in the order they are first seen, so every
+# url string is stored exactly once and the rest of the crawl state can be kept as ints.
+class URLTable:
+    def __init__(self):
+        self.ids = {}
+        self.urls = []
+
+    # Get the id of the url, assigning the next id if it has not been seen before.
+    def intern(self, url):
+        url_id = self.ids.get(url)
+        if url_id is None:
+            url_id = len(self.urls)
+            self.ids[url] = url_id
+            self.urls.append(url)
+        return url_id
+
+    # Get the id of the url, or None if it has not been seen before.
+    def get(self, url):
+        return self.ids.get(url)
+
+    # Get the url with the given id.
+    def url(self, url_id):
+        return self.urls[url_id]
+
+    def __len__(self):
+        return len(self.urls)
+
+# A set of ints stored as one bit per id.
+class Bitmap:
+    def __init__(self):
+        self.bits = bytearray()
+        self.count = 0
+
+    def add(self, item):
+        byte, bit = item >> 3, 1 << (item & 7)
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(max(byte + 1 - len(self.bits), len(self.bits))))
+        if not self.bits[byte] & bit:
+            self.bits[byte] |= bit
+            self.count += 1
+
+    def __contains__(self, item):
+        byte = item >> 3
+        return byte < len(self.bits) and bool(self.bits[byte] & (1 << (item & 7)))
+
+    def __len__(self):
+        return self.count
+
+# The crawled graph over url ids, kept as an append-only edge list plus the order in which
+# nodes were admitted, with the node/edge methods the crawler uses on an nx.DiGraph.
+# Removing a node does not touch the edge list: an edge only counts if it was added after the
+# latest admission of both its endpoints, exactly like edges dropped by nx.DiGraph.remove_node.
+# If an EdgeLog is given, node and edge changes are streamed to it instead and the edge list is
+# not kept in memory, so only the counts are available until the log is loaded.
+class CrawlGraph:
+    def __init__(self, log=None):
+        # Node ids in the order they were admitted (a re-admitted node appears again).
+        self.order = array('q')
+        # Per id: position in order of its current admission (-1 if not in the graph), the
+        # number of edges at that admission, and the number of edges into it since then.
+        self.admitted = array('q')
+        self.edges_at_admission = array('q')
+        self.in_edges = array('q')
+        # The edge list.
+        self.src = array('q')
+        self.dst = array('q')
+        self.log = log
+        self.edges_added = 0
+        self.n = 0
+        self.m = 0
+
+    def add_node(self, node):
+        if node >= len(self.admitted):
+            grow = node + 1 - len(self.admitted)
+            self.admitted.extend([-1] * grow)
+            self.edges_at_admission.extend([0] * grow)
+            self.in_edges.extend([0] * grow)
+        if self.admitted[node] < 0:
+            self.admitted[node] = len(self.order)
+            self.order.append(node)
+            self.edges_at_admission[node] = self.edges_added
+            self.in_edges[node] = 0
+            self.n += 1
+            if self.log is not None:
+                self.log.add_node(node)
+
+    # Add an edge between two nodes of the graph. The crawler only adds each edge once, from a
+    # page that has not been visited before, so the edge list needs no deduplication.
+    def add_edge(self, u, v):
+        if self.log is not None:
+            self.log.add_edge(u, v)
+        else:
+            self.src.append(u)
+            self.dst.append(v)
+        self.edges_added += 1
+        self.in_edges[v] += 1
+        self.m += 1
+
+    # Remove a node from the graph. The crawler only removes pages whose fetch failed, before
+    # any of their out-edges were added, so only the node's in-edges disappear with it.
+    def remove_node(self, node):
+        self.admitted[node] = -1
+        self.m -= self.in_edges[node]
+        self.in_edges[node] = 0
+        self.n -= 1
+        if self.log is not None:
+            self.log.remove_node(node)
+
+    def __contains__(self, node):
+        return node < len(self.admitted) and self.admitted[node] >= 0
+
+    def number_of_nodes(self):
+        return self.n
+
+    def number_of_edges(self):
+        return self.m
+
+    # Build the nx.DiGraph of the crawl, keyed by url if a URLTable is given and by id otherwise.
+    def to_networkx(self, table=None):
+        if self.log is not None:
+            raise ValueError("the edges of the graph are in " + self.log.path + ", load it with load_edge_log")
+        label = table.urls.__getitem__ if table is not None else int
+        G = nx.DiGraph()
+        admitted = self.admitted
+        G.add_nodes_from(label(node) for position, node in enumerate(self.order) if admitted[node] == position)
+        since = self.edges_at_admission
+        G.add_edges_from((label(u), label(v)) for k, (u, v) in enumerate(zip(self.src, self.dst))
+                         if admitted[u] >= 0 and admitted[v] >= 0 and k >= since[u] and k >= since[v])
+        return G
+
+# Everything a crawl keeps in memory: the url table, the graph over url ids, the frontier of
+# ids to visit (ordered by the named policy, see frontier.py) and the bitmap of visited ids,
+# plus the commit step that grows them from a page.
+# If an edge log file is given, the graph is streamed to it (see edge_log.py) instead of being
+# kept in memory.
+class CrawlState:
+    def __init__(self, start_url, limit, domain, policy="bfs", max_depth=None, edge_log_file=None):
+        self.limit = limit
+        self.domain = domain
+        self.table = URLTable()
+        start = self.table.intern(start_url)
+        self.edge_log = EdgeLog(edge_log_file, self.table) if edge_log_file is not None else None
+        self.graph = CrawlGraph(self.edge_log)
+        self.graph.add_node(start)
+        self.frontier = new_frontier(policy, self.table, max_depth)
+        self.frontier.push(start)
+        self.visited = Bitmap()
+
+    # Add the hyperlinks found on the current page to the graph and queue the unvisited ones.
+    # New nodes are only admitted while the graph has fewer than limit nodes; after that only
+    # edges between existing nodes are added.
+    def add_links(self, current, links):
+        graph = self.graph
+        queued = []
+        # Each edge must be added once, so skip repeats of a link on the same page.
+        for link in dict.fromkeys(links):
+            # Skip if the current url is not in the crawled domain.
+            if not in_scope(link, self.domain):
+                continue
+
+            if graph.number_of_nodes() < self.limit:
+                # Make new node and add edge between existing node and new node.
+                link = self.table.intern(link)
+                graph.add_node(link)
+                graph.add_edge(current, link)
+                # Add the hyperlink to the list of next visits if it is not visited yet.
+                if link not in self.visited:
+                    queued.append(link)
+            else:
+                # Only add edges between existing nodes (from this point, no new nodes are added).
+                link = self.table.get(link)
+                if link is None or link not in graph:
+                    continue
+                graph.add_edge(current, link)
+        self.frontier.push_links(current, queued)
+
+    # Build the nx.DiGraph of the crawl keyed by url (from the edge log if there is one).
+    def to_networkx(self):
+        if self.edge_log is not None:
+            self.edge_log.flush()
+            return load_edge_log(self.edge_log.path)
+        return self.graph.to_networkx(self.table)
+
+    # Write out the rest of the edge log, if there is one.
+    def close(self):
+        if self.edge_log is not None:
+            self.edge_log.close()
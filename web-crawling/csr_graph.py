@@ -0,0 +1,200 @@
+import os
+import json
+import pickle
+import numpy as np
+import networkx as nx
+
+# A graph stored in compressed sparse row (CSR) form: the neighbors of node i (numbered
+# 0 ... n-1) are neighbors[offsets[i]:offsets[i+1]], sorted. Directed graphs store the
+# successors of every node, undirected graphs store every edge in both directions (and a
+# self-loop once). Parallel edges of a multigraph are repeated.
+# The original node of every index is kept in labels (None if the nodes are just 0 ... n-1), as
+# an int array if the nodes are ints and as a list otherwise.
+# This takes 8-16 bytes per edge, against the hundreds of bytes of a NetworkX dict-of-dicts.
+class CSRGraph:
+    def __init__(self, offsets, neighbors, directed, labels=None, multigraph=False, m=None, graph=None):
+        self.offsets = offsets
+        self.neighbors = neighbors
+        self.directed = directed
+        self.labels = labels
+        self.multigraph = multigraph
+        self.n = len(offsets) - 1
+        if m is None:
+            m = len(neighbors) if directed else (len(neighbors) + int(np.count_nonzero(self.sources() == neighbors))) // 2
+        self.m = m
+        self.graph = graph if graph is not None else {}
+
+    def number_of_nodes(self):
+        return self.n
+
+    def number_of_edges(self):
+        return self.m
+
+    def is_directed(self):
+        return self.directed
+
+    def is_multigraph(self):
+        return self.multigraph
+
+    # Get the array of neighbors (successors for directed graphs) of the node with index i.
+    def neighbors_of(self, i):
+        return self.neighbors[self.offsets[i]:self.offsets[i + 1]]
+
+    # Get the node with index i.
+    def label(self, i):
+        if self.labels is None:
+            return i
+        return self.labels[i].item() if isinstance(self.labels, np.ndarray) else self.labels[i]
+
+    # Get the source node index of every entry of neighbors.
+    def sources(self):
+        return np.repeat(np.arange(self.n, dtype=self.neighbors.dtype), np.diff(self.offsets))
+
+    # Get the array of out-degrees (of degrees for undirected graphs, where self-loops count twice
+    # as in NetworkX).
+    def out_degree(self):
+        degree = np.diff(self.offsets)
+        if not self.directed:
+            degree = degree + np.bincount(self.neighbors[self.sources() == self.neighbors], minlength=self.n)
+        return degree
+
+    # Get the array of in-degrees (of degrees for undirected graphs).
+    def in_degree(self):
+        if not self.directed:
+            return self.out_degree()
+        return np.bincount(self.neighbors, minlength=self.n)
+
+    def degree(self):
+        if not self.directed:
+            return self.out_degree()
+        return self.out_degree() + self.in_degree()
+
+# Build a CSRGraph from edge arrays over node indices 0 ... n-1.
+# For undirected graphs every edge is given once, in either direction.
+def csr_from_edges(src, dst, n, directed, labels=None, multigraph=False, graph=None):
+    src = np.asarray(src, dtype=np.int64)
+    dst = np.asarray(dst, dtype=np.int64)
+    m = len(src)
+    if not directed:
+        # Store both directions of every edge, but self-loops only once.
+        loop = src == dst
+        src, dst = np.concatenate((src, dst[~loop])), np.concatenate((dst, src[~loop]))
+    dtype = np.int32 if n < 2**31 else np.int64
+    if n < 2**31:
+        # Sort by (source, neighbor) as single 64-bit keys, which is much faster than lexsort.
+        neighbors = (np.sort((src << 32) | dst) & 0xFFFFFFFF).astype(dtype)
+    else:
+        neighbors = dst[np.lexsort((dst, src))].astype(dtype)
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=offsets[1:])
+    return CSRGraph(offsets, neighbors, directed, labels, multigraph, m, graph)
+
+# Convert a NetworkX graph to a CSRGraph, numbering the nodes in the order of G.nodes().
+def to_csr(G):
+    nodes = list(G.nodes())
+    labels = None
+    if nodes != list(range(len(nodes))):
+        labels = np.array(nodes, dtype=np.int64) if all(type(node) is int for node in nodes) else nodes
+    index = {node: i for i, node in enumerate(nodes)}
+    edges = np.array([(index[u], index[v]) for u, v in G.edges()], dtype=np.int64).reshape(-1, 2)
+    return csr_from_edges(edges[:, 0], edges[:, 1], len(nodes), G.is_directed(), labels, G.is_multigraph(), dict(G.graph))
+
+# Get the simple undirected graph of a CSRGraph, without edge directions, parallel edges or
+# self-loops (the graph distances and triangles are computed on).
+def undirected_csr(csr):
+    src = csr.sources().astype(np.int64)
+    dst = np.asarray(csr.neighbors, dtype=np.int64)
+    keep = src != dst
+    keys = np.sort((np.minimum(src[keep], dst[keep]) << 32) | np.maximum(src[keep], dst[keep]))
+    keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))] if len(keys) else keys
+    return csr_from_edges(keys >> 32, keys & 0xFFFFFFFF, csr.n, False, csr.labels, graph=dict(csr.graph))
+
+# Convert a CSRGraph to the equivalent NetworkX graph.
+def from_csr(csr):
+    if csr.directed:
+        G = nx.MultiDiGraph() if csr.multigraph else nx.DiGraph()
+    else:
+        G = nx.MultiGraph() if csr.multigraph else nx.Graph()
+    G.graph.update(csr.graph)
+    labels = csr.labels.tolist() if isinstance(csr.labels, np.ndarray) else csr.labels
+    G.add_nodes_from(labels if labels is not None else range(csr.n))
+    src = csr.sources()
+    dst = np.asarray(csr.neighbors)
+    # Undirected edges are stored in both directions, so keep one of them.
+    if not csr.directed:
+        keep = src <= dst
+        src, dst = src[keep], dst[keep]
+    if labels is not None:
+        G.add_edges_from((labels[u], labels[v]) for u, v in zip(src.tolist(), dst.tolist()))
+    else:
+        G.add_edges_from(zip(src.tolist(), dst.tolist()))
+    return G
+
+# Save a graph (NetworkX or CSRGraph) as a CSR directory at path (by convention ending in .csr):
+# offsets.npy and neighbors.npy, the node labels if they are not 0 ... n-1 (in labels.npy if they
+# are ints and in labels.json otherwise), and meta.json with the kind of graph, its size and the
+# JSON-serializable graph attributes.
+def save_csr(G, path):
+    csr = G if isinstance(G, CSRGraph) else to_csr(G)
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, "offsets.npy"), np.asarray(csr.offsets))
+    np.save(os.path.join(path, "neighbors.npy"), np.asarray(csr.neighbors))
+    for labels_file in ("labels.npy", "labels.json"):
+        if os.path.exists(os.path.join(path, labels_file)):
+            os.remove(os.path.join(path, labels_file))
+    if isinstance(csr.labels, np.ndarray):
+        np.save(os.path.join(path, "labels.npy"), csr.labels)
+    elif csr.labels is not None:
+        with open(os.path.join(path, "labels.json"), "w", encoding="utf-8") as f:
+            json.dump(list(csr.labels), f)
+    graph = {}
+    for key, value in csr.graph.items():
+        try:
+            json.dumps(value)
+            graph[key] = value
+        except (TypeError, ValueError):
+            pass
+    meta = {"format": "csr", "version": 1, "directed": csr.directed, "multigraph": csr.multigraph, "n": csr.n, "m": csr.m, "graph": graph}
+    with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+# Load a CSR directory as a CSRGraph. With mmap the arrays are memory-mapped read-only instead
+# of being read, so loading takes no time or memory until they are used.
+def load_csr(path, mmap=True):
+    with open(os.path.join(path, "meta.json"), "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    mmap_mode = "r" if mmap else None
+    offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode=mmap_mode)
+    neighbors = np.load(os.path.join(path, "neighbors.npy"), mmap_mode=mmap_mode)
+    labels = None
+    if os.path.exists(os.path.join(path, "labels.npy")):
+        labels = np.load(os.path.join(path, "labels.npy"), mmap_mode=mmap_mode)
+    elif os.path.exists(os.path.join(path, "labels.json")):
+        with open(os.path.join(path, "labels.json"), "r", encoding="utf-8") as f:
+            labels = json.load(f)
+    return CSRGraph(offsets, neighbors, meta["directed"], labels, meta.get("multigraph", False), meta["m"], meta.get("graph"))
+
+# Check whether a graph file is in CSR format (a directory) rather than a pickle.
+def is_csr(path):
+    return os.path.isdir(path) or path.endswith(".csr")
+
+# Save a NetworkX graph, as a CSR directory if the path ends in .csr and as a pickle otherwise.
+def save_graph(G, save_file):
+    if is_csr(save_file):
+        save_csr(G, save_file)
+    else:
+        with open(save_file, "wb") as f:
+            pickle.dump(G, f)
+
+# Load a graph saved in either format as a NetworkX graph.
+def load_graph(graph_file):
+    if is_csr(graph_file):
+        return from_csr(load_csr(graph_file))
+    with open(graph_file, "rb") as f:
+        return pickle.load(f)
+
+# Load a graph saved in either format as a CSRGraph.
+def load_csr_graph(graph_file, mmap=True):
+    if is_csr(graph_file):
+        return load_csr(graph_file, mmap)
+    return to_csr(load_graph(graph_file))
@@ -0,0 +1,76 @@
+import numpy as np
+
+# Empirical distributions of samples, such as node degrees, computed with NumPy only so that they
+# take a few passes over the data even for 10^8 samples.
+# Integer samples with a small range (like degrees) are counted with np.bincount, and other
+# samples are sorted once with np.unique.
+
+# Get the number of samples equal to every integer 0 ... max(degrees), i.e. the degree histogram.
+def degree_histogram(degrees):
+    degrees = np.asarray(degrees)
+    if degrees.size == 0:
+        return np.zeros(0, dtype=np.int64)
+    if degrees.min() < 0:
+        raise ValueError("degrees must be non-negative")
+    return np.bincount(degrees.ravel().astype(np.int64, copy=False))
+
+# Get the distinct values of the samples and how many times each appears, in increasing order.
+def value_counts(data):
+    data = np.asarray(data).ravel()
+    if data.size and np.issubdtype(data.dtype, np.integer) and data.min() >= 0 and data.max() <= 4 * data.size + 1024:
+        counts = np.bincount(data.astype(np.int64, copy=False))
+        values = np.flatnonzero(counts)
+        return values, counts[values]
+    return np.unique(data, return_counts=True)
+
+# Get the CDF of integer degrees at every k = 0 ... max(degrees): the fraction of samples <= k.
+def degree_cdf(degrees):
+    histogram = degree_histogram(degrees)
+    if not len(histogram):
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+    return np.arange(len(histogram)), np.cumsum(histogram) / histogram.sum()
+
+# Get the empirical CDF of the samples at their distinct values x: the fraction of samples <= x.
+def cdf(data):
+    values, counts = value_counts(data)
+    return values, np.cumsum(counts) / max(counts.sum(), 1)
+
+# Get the empirical CCDF of the samples at their distinct values x: the fraction of samples > x
+# (so 0 at the largest value), as plotted in rank plots.
+def ccdf(data):
+    values, counts = value_counts(data)
+    total = max(counts.sum(), 1)
+    return values, (total - np.cumsum(counts)) / total
+
+# Get the PDF of the samples in bins of width dx centered on min(data) + i dx, as the centers x of
+# the non-empty bins and the number of samples y in each (divided by the number of samples and dx
+# if density is True, so that it integrates to 1).
+def pdf(data, dx=1, density=False):
+    data = np.asarray(data, dtype=np.float64).ravel()
+    if data.size == 0:
+        return np.zeros(0), np.zeros(0)
+    low = data.min()
+    counts = np.bincount(((data + dx / 2 - low) // dx).astype(np.int64))
+    bins = np.flatnonzero(counts)
+    y = counts[bins] / (data.size * dx) if density else counts[bins]
+    return low + bins * dx, y
+
+# Get the PDF of positive samples in logarithmic bins, bins_per_decade bins per factor of 10, which
+# keeps the tail of a heavy-tailed distribution from being lost in empty or single-sample bins.
+# Returns the geometric centers x of the non-empty bins and the density y in each: the fraction of
+# the positive samples in the bin divided by its width. Non-positive samples are ignored.
+def log_binned_pdf(data, bins_per_decade=10):
+    data = np.asarray(data, dtype=np.float64).ravel()
+    data = data[data > 0]
+    if data.size == 0:
+        return np.zeros(0), np.zeros(0)
+    low, high = np.log10(data.min()), np.log10(data.max())
+    # Give samples that are all equal one bin of the usual width.
+    high = max(high, low + 1 / bins_per_decade)
+    bins = max(int(np.ceil((high - low) * bins_per_decade)), 1)
+    edges = np.logspace(low, high, bins + 1)
+    # Place every sample in its bin directly from its logarithm, and keep the largest in the last.
+    index = np.minimum(((np.log10(data) - low) * bins / (high - low)).astype(np.int64), bins - 1)
+    counts = np.bincount(index, minlength=bins)
+    keep = np.flatnonzero(counts)
+    return np.sqrt(edges[keep] * edges[keep + 1]), counts[keep] / (data.size * np.diff(edges)[keep])
@@ -0,0 +1,94 @@
+import zlib
+import networkx as nx
+
+# Append-only log of the crawled graph, written while the crawl runs so that its edges do not
+# have to be kept in memory and the graph of a crawl still in progress can be loaded.
+# The log is gzip-compressed TSV with one record per line, in the order the crawler made them:
+#   N <id> <url>   a node was added (the url is only written the first time the id appears)
+#   E <u> <v>      an edge was added between two nodes
+#   R <id>         a node was removed together with its edges
+# Replaying the records into an nx.DiGraph gives exactly the graph the crawl built.
+# The records are flushed every `every` records with a sync flush, so everything up to the last
+# flush can be read back even while the file is still being written or after a crash.
+class EdgeLog:
+    def __init__(self, path, table, every=1000):
+        self.path = path
+        self.table = table
+        self.every = every
+        self.labelled = bytearray()
+        self.pending = []
+        self.file = open(path, "wb")
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def add_node(self, node):
+        if node >= len(self.labelled):
+            self.labelled.extend(bytes(node + 1 - len(self.labelled)))
+        if self.labelled[node]:
+            self.write("N\t%d" % node)
+        else:
+            self.labelled[node] = 1
+            self.write("N\t%d\t%s" % (node, self.table.url(node)))
+
+    def add_edge(self, u, v):
+        self.write("E\t%d\t%d" % (u, v))
+
+    def remove_node(self, node):
+        self.write("R\t%d" % node)
+
+    def write(self, record):
+        self.pending.append(record)
+        if len(self.pending) >= self.every:
+            self.flush()
+
+    # Compress the buffered records and push them to the file so that readers can see them.
+    def flush(self):
+        if self.file.closed:
+            return
+        if self.pending:
+            self.file.write(self.compressor.compress(("\n".join(self.pending) + "\n").encode("utf-8")))
+            self.pending = []
+        self.file.write(self.compressor.flush(zlib.Z_SYNC_FLUSH))
+        self.file.flush()
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.write(self.compressor.flush())
+        self.file.close()
+
+# Read the records of an edge log as lists of fields.
+# The log may still be written to or cut short by a crash: reading stops quietly at the end of
+# the compressed data, and a partially written final record is ignored.
+def read_edge_log(path, chunk_size=1 << 20):
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    rest = b""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            try:
+                data = decompressor.decompress(chunk)
+            except zlib.error:
+                break
+            lines = (rest + data).split(b"\n")
+            rest = lines.pop()
+            for line in lines:
+                yield line.decode("utf-8").split("\t")
+
+# Load the graph of a crawl from its edge log as an nx.DiGraph keyed by url.
+def load_edge_log(path):
+    G = nx.DiGraph()
+    urls = {}
+    for record in read_edge_log(path):
+        kind = record[0]
+        if kind == "E":
+            G.add_edge(urls[record[1]], urls[record[2]])
+        elif kind == "N":
+            if len(record) > 2:
+                urls[record[1]] = record[2]
+            G.add_node(urls[record[1]])
+        elif kind == "R":
+            G.remove_node(urls[record[1]])
+    return G
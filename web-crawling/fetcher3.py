@@ -14,13 +14,19 @@ The output is a list (may be empty "[]") of hyperlinks which looks like:
 The output is "None" if the URL is not a valid HTML page or some error occurred.
 
 Note: Updated urllib request to avoid 403 errors (Andrew Ma, ama2@caltech.edu)
+Note: Pages are fetched over pooled keep-alive connections, and pages that sent an ETag or
+Last-Modified header are re-fetched with conditional requests, reusing their links on 304.
+Pages are parsed chunk by chunk as they download, up to max_body_bytes per page.
 """
 
+import os
+import json
+import codecs
+import atexit
 from html.parser import HTMLParser
-from urllib.parse import urljoin
-from urllib import request
+from urllib.parse import urljoin, urlsplit
 from urllib.error import URLError
-import urllib
+from http_pool import ConnectionPool
 
 
 # Our version of the HTMLParser, which handles start tags differently than Python's
@@ -33,57 +39,181 @@ class MyHTMLParser(HTMLParser):
 
     def handle_starttag(self, tag, attrs):
         if tag == 'a' or tag == 'area': # extract href links from "a" and "area" tags
-            href = [v for (k, v) in attrs if k == 'href']
+            href = [v for (k, v) in attrs if k == 'href' and v is not None]
             self.urls.extend(href)
         if tag == 'frame' or tag == 'iframe': # extra src links from "frame" and "iframe" tags
-            src = [v for (k, v) in attrs if k == 'src']
+            src = [v for (k, v) in attrs if k == 'src' and v is not None]
             self.urls.extend(src)
 
     # Refine the hyperlinks: ignore the parameters in dynamic URLs, convert
     # all hyperlinks to absolute URLs, and remove duplicated URLs.
     def get_links(self, current_url):
         res = set()       # use a set to avoid duplicated URLs
+        absolute = LinkNormalizer(current_url)
         for url in self.urls:
-            url = url.split('?')[0]   # extract the part before '?' if any
-            url = url.split('#')[0]   # extract the part before '#' if any
-            url = urljoin(current_url, url.strip())   # convert to absolute URL
+            url = url.split('?', 1)[0]   # extract the part before '?' if any
+            url = url.split('#', 1)[0]   # extract the part before '#' if any
+            url = absolute(url.strip())   # convert to absolute URL
             if url.startswith("http://") or url.startswith("https://"):
                 res.add(url)
         res.discard(current_url)    # self-link is removed
         return list(res)
 
+# Converts the hyperlinks of one page to absolute URLs, giving the same results as
+# urljoin(base_url, link). The base URL is parsed once per page, and the common link shapes
+# (absolute, root-relative and plain relative paths) are joined by string concatenation.
+# Anything that urljoin would rewrite (dot segments, empty segments, other schemes, unusual
+# characters) falls back to urljoin itself.
+class LinkNormalizer:
+    def __init__(self, base_url):
+        self.base_url = base_url
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme
+        self.origin = None
+        self.directory = None
+        if parts.scheme in ('http', 'https') and parts.netloc and base_url.isprintable():
+            self.origin = parts.scheme + '://' + parts.netloc
+            path = parts.path or '/'
+            if '//' not in path and ';' not in path and not is_dotted(path):
+                self.directory = self.origin + path[:path.rfind('/') + 1]
+
+    def __call__(self, link):
+        if ';' not in link and link.isprintable():
+            if link.startswith('http://') or link.startswith('https://'):
+                if link[link.index('//') + 2:][:1] not in ('', '/'):
+                    return link
+            elif self.origin is not None and not is_dotted(link):
+                if link.startswith('//'):
+                    if link[2:3] not in ('', '/'):
+                        return self.scheme + ':' + link
+                elif link.startswith('/'):
+                    return self.origin + link
+                elif link and self.directory is not None and ':' not in link and '//' not in link:
+                    return self.directory + link
+        return urljoin(self.base_url, link)
+
+# Check whether a path may contain '.' or '..' segments that urljoin would resolve.
+def is_dotted(path):
+    return './' in path or path.endswith('.')
+
+# Keep-alive connections shared by every fetch.
+pool = ConnectionPool(timeout=2)
+
+# The ETag/Last-Modified validators of fetched pages and the links found on them, by url. Only
+# recorded once enable_validator_cache is called: a single crawl fetches every page once, so they
+# would only take memory.
+validators = {}
+cache_validators = False
+
+# Whether fetch_links parses pages chunk by chunk while they download, rather than after.
+stream_pages = True
+
+# Largest number of body bytes parsed per page when streaming; the download of longer pages
+# stops there and only the links found so far are kept. None parses pages of any size.
+max_body_bytes = 8 * 1024 * 1024
+
 # Fetch an HTML file and return the real (redirected) URL and the content.
 def fetch_html_page(url):
+    real_url, status, headers, content = fetch_page(url)
+    return (real_url, content)
+
+# Fetch a page, sending the given validators as a conditional request if any.
+# Return the real (redirected) URL, the status (None if the fetch failed), the response
+# headers, and the content if it is an HTML page.
+def fetch_page(url, cached=None):
     content = None
     real_url = url
-    req = urllib.request.Request(
-        url=url,
-        headers={'User-Agent': 'Mozilla/5.0'}
-    )
+    status = None
+    response_headers = {}
     try:
-        with urllib.request.urlopen(req, timeout=2) as usock:
-            real_url = usock.url   # real_url will be changed if there is a redirection
-            if "text/html" in usock.info()['content-type']:
-                content=usock.read().decode('utf-8')    # only fetch it if it is html (not mp3/avi/...)
+        response = pool.get(url, request_headers(cached))
+        real_url = response.url   # real_url will be changed if there is a redirection
+        status = response.status
+        response_headers = response.headers
+        if status == 200 and "text/html" in (response.headers.get('content-type') or ""):
+            content = response.body.decode('utf-8')    # only fetch it if it is html (not mp3/avi/...)
     # Terminate on CTRL+C sequences, and pass URLError up the stack.
     except KeyboardInterrupt:
         raise
     except:
         pass
-    return (real_url, content)
+    return (real_url, status, response_headers, content)
+
+# Fetch a page like fetch_page, but feed an HTML body to our HTMLParser chunk by chunk as it
+# arrives instead of holding it in memory, stopping after max_body_bytes.
+# Return the real (redirected) URL, the status (None if the fetch failed), the response
+# headers, and the parser holding the page's links if it is an HTML page.
+def stream_page(url, cached=None):
+    parser = None
+    real_url = url
+    status = None
+    response_headers = {}
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    received = 0
+
+    # Feed a chunk of the body to the parser, returning True once the body is too long.
+    def write(chunk):
+        nonlocal received
+        too_long = max_body_bytes is not None and received + len(chunk) > max_body_bytes
+        if too_long:
+            chunk = chunk[:max_body_bytes - received]
+        received += len(chunk)
+        parser.feed(decoder.decode(chunk))
+        return too_long
+
+    # Only stream the body if it is html (not mp3/avi/...).
+    def open_stream(status, headers):
+        nonlocal parser
+        if status != 200 or "text/html" not in (headers.get('content-type') or ""):
+            return None
+        parser = MyHTMLParser()
+        return write
+
+    try:
+        response = pool.get(url, request_headers(cached), open_stream)
+        real_url = response.url   # real_url will be changed if there is a redirection
+        status = response.status
+        response_headers = response.headers
+        if parser is not None and not response.truncated:
+            parser.feed(decoder.decode(b'', final=True))
+    # Terminate on CTRL+C sequences, and pass URLError up the stack.
+    except KeyboardInterrupt:
+        raise
+    except:
+        parser = None
+    return (real_url, status, response_headers, parser)
+
+# Build the headers of a request, making it conditional if the page has validators.
+def request_headers(cached):
+    headers = {'User-Agent': 'Mozilla/5.0'}
+    if cached is not None:
+        if cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+    return headers
 
 # Fetch the hyperlinks by first fetching the content then using our HTMLParser to
-# parse them.
+# parse them, or by parsing the content as it streams in if stream_pages is set.
+# Pages that have not changed since they were last fetched are not parsed again.
 def fetch_links(url):
     links = None
     try:
-        parser = MyHTMLParser()
-        real_url, content = fetch_html_page(url)
-        if content is not None:
-            parser.urls = []
-            parser.feed(content)
+        cached = validators.get(url)
+        if stream_pages:
+            real_url, status, headers, parser = stream_page(url, cached)
+        else:
+            real_url, status, headers, content = fetch_page(url, cached)
+            parser = None
+            if content is not None:
+                parser = MyHTMLParser()
+                parser.feed(content)
+        if status == 304 and cached is not None:
+            return list(cached['links'])
+        if parser is not None:
             parser.close()
             links = parser.get_links(real_url)
+            remember_validators(url, headers, links)
     # Terminate on CTRL+C sequences, and pass URLError up the stack.
     except (KeyboardInterrupt, URLError):
         raise
@@ -91,6 +221,33 @@ def fetch_links(url):
         pass
     return links
 
+# Store the validators of a fetched page and its links, if the server sent any validators and
+# the validator cache is enabled.
+def remember_validators(url, headers, links):
+    if not cache_validators:
+        return
+    etag = headers.get('etag')
+    last_modified = headers.get('last-modified')
+    if etag or last_modified:
+        validators[url] = {'etag': etag, 'last_modified': last_modified, 'links': links}
+    else:
+        validators.pop(url, None)
+
+# Load the validators saved by a previous crawl from the given file (if it exists), and save
+# them back to it when the program exits, so recrawls only download pages that changed.
+def enable_validator_cache(validator_file):
+    global cache_validators
+    cache_validators = True
+    if os.path.exists(validator_file):
+        with open(validator_file, 'r') as f:
+            validators.update(json.load(f))
+    atexit.register(save_validators, validator_file)
+
+# Save the validators of all fetched pages to the given file.
+def save_validators(validator_file):
+    with open(validator_file, 'w') as f:
+        json.dump(validators, f)
+
 if __name__ == "__main__":
     import sys
     if len(sys.argv) != 2 or not sys.argv[1].startswith("http://"):
@@ -0,0 +1,224 @@
+import numpy as np
+from csr_graph import CSRGraph, to_csr, undirected_csr
+
+# Graphs are coarsened until they have at most this many nodes, or stop shrinking.
+coarsest_nodes = 50
+
+# Depth of the quadtree the repulsion is approximated on (cells of 1 / 2^depth of the layout).
+tree_depth = 16
+
+# Lay out a graph (NetworkX or CSRGraph, treated as undirected) with a force-directed algorithm
+# that scales to graphs of 10^4 - 10^5 nodes, where nx.spring_layout computes all the n^2
+# repulsions of Fruchterman-Reingold at every iteration.
+# The graph is first coarsened into smaller and smaller graphs by merging matched pairs of
+# neighbors (see coarsen). The coarsest one is laid out from random positions, and every finer one
+# starts from the positions of the nodes it was merged into, so that it only needs to be refined.
+# At every level the Fruchterman-Reingold forces (attraction d^2 / k along the edges, repulsion
+# k^2 / d between all the nodes) move the nodes by at most a temperature that cools linearly, where
+# the repulsion is approximated with a Barnes-Hut quadtree (see repulsion): far away groups of
+# nodes act as a single node at their center of mass, which makes it O(n log n). A weak gravity
+# keeps the connected components from drifting apart.
+# Returns the positions as a node -> array dict like the NetworkX layouts, to be passed as pos= to
+# nx.draw, rescaled to fit [-scale, scale]^2 around center.
+def force_layout(G, iterations=50, theta=1.0, gravity=0.05, seed=0, scale=1, center=None):
+    csr = undirected_csr(G if isinstance(G, CSRGraph) else to_csr(G))
+    positions = force_positions(csr, iterations, theta, gravity, seed)
+    if len(positions):
+        positions -= positions.mean(axis=0)
+        extent = np.abs(positions).max()
+        if extent > 0:
+            positions *= scale / extent
+    if center is not None:
+        positions += np.asarray(center, dtype=np.float64)
+    if csr.labels is None:
+        nodes = range(csr.n)
+    else:
+        nodes = csr.labels.tolist() if isinstance(csr.labels, np.ndarray) else csr.labels
+    return dict(zip(nodes, positions))
+
+# Get the n x 2 array of positions of the nodes of a simple undirected CSRGraph, in units of the
+# natural edge length k = 1.
+def force_positions(csr, iterations=50, theta=1.0, gravity=0.05, seed=0):
+    rng = np.random.default_rng(seed)
+    src = csr.sources().astype(np.int64)
+    dst = np.asarray(csr.neighbors, dtype=np.int64)
+    levels = [(csr.n, src, dst, np.ones(len(src)), np.ones(csr.n))]
+    parents = []
+    while levels[-1][0] > coarsest_nodes:
+        n, src, dst, weights, masses = levels[-1]
+        parent, coarse_n = coarsen(n, src, dst, weights, masses, rng)
+        if coarse_n > 0.8 * n:
+            break
+        parents.append(parent)
+        levels.append(coarse_graph(parent, coarse_n, src, dst, weights, masses))
+
+    # Lay out the coarsest graph, in an area growing with the number of nodes it stands for. Finer
+    # graphs only need a few iterations to refine the layout of the coarser one.
+    n = levels[-1][0]
+    positions = (rng.random((n, 2)) - 0.5) * np.sqrt(max(csr.n, 1))
+    temperature = 0.1 * np.sqrt(max(csr.n, 1)) + 1
+    for level in range(len(levels) - 1, -1, -1):
+        n, src, dst, weights, masses = levels[level]
+        if level < len(levels) - 1:
+            # Start every node at the position of the node it was merged into, jittered to tell the
+            # merged nodes apart. The coarse nodes repelled each other with the masses of the nodes
+            # they stand for, so their layout already has the size of the finer one.
+            positions = positions[parents[level]] + rng.normal(0, 0.1, (n, 2))
+            temperature = 2.0
+            steps = max(iterations // 4, 5)
+        else:
+            # Small coarsest graphs get more iterations, to untangle folds the finer graphs inherit.
+            steps = 4 * iterations if n <= coarsest_nodes else iterations
+        positions = refine(positions, src, dst, weights, masses, steps, temperature, theta, gravity)
+    return positions
+
+# Move the nodes by the forces on them for the given number of iterations, starting at the given
+# temperature (the largest move) and cooling linearly.
+def refine(positions, src, dst, weights, masses, iterations, temperature, theta, gravity):
+    n = len(positions)
+    if n < 2:
+        return positions
+    for i in range(iterations):
+        forces = repulsion(positions, masses, theta)
+        # Attraction d^2 / k along every edge (stored in both directions), times its multiplicity.
+        delta = positions[dst] - positions[src]
+        distance = np.sqrt((delta ** 2).sum(axis=1))
+        pull = weights * distance
+        forces[:, 0] += np.bincount(src, weights=pull * delta[:, 0], minlength=n)
+        forces[:, 1] += np.bincount(src, weights=pull * delta[:, 1], minlength=n)
+        forces -= gravity * masses[:, None] * positions
+        # Move every node along its force by at most the temperature.
+        length = np.sqrt((forces ** 2).sum(axis=1))
+        step = np.minimum(length, temperature * (1 - i / iterations)) / np.maximum(length, 1e-12)
+        positions = positions + forces * step[:, None]
+    return positions
+
+# Get the repulsion m_u m_v k^2 / d (with k = 1) on every node from all the others, where m is the
+# number of nodes of the original graph a node stands for.
+# The nodes are sorted into a quadtree by their Morton codes, and every node walks it from the root
+# one level at a time: a cell that is small compared to its distance (size / distance < theta), or
+# holds a single node, pushes the node away from its center of mass with its total mass, and the
+# others are opened into their children. The (node, cell) pairs of every level are handled at once.
+def repulsion(positions, masses, theta):
+    n = len(positions)
+    low = positions.min(axis=0)
+    size = max(float((positions.max(axis=0) - low).max()), 1e-9)
+    cells_per_side = 1 << tree_depth
+    corner = np.minimum(((positions - low) / size * cells_per_side).astype(np.int64), cells_per_side - 1)
+    codes = spread_bits(corner[:, 0]) | (spread_bits(corner[:, 1]) << 1)
+    order = np.argsort(codes, kind="stable")
+    codes = codes[order]
+    weighted = positions[order] * masses[order, None]
+
+    # The cells of every level: their code prefixes, masses, centers of mass and node counts.
+    levels = []
+    for level in range(tree_depth + 1):
+        prefixes = codes >> (2 * (tree_depth - level))
+        starts = np.flatnonzero(np.concatenate(([True], prefixes[1:] != prefixes[:-1])))
+        mass = np.add.reduceat(masses[order], starts)
+        center = np.add.reduceat(weighted, starts, axis=0) / mass[:, None]
+        count = np.diff(np.append(starts, n))
+        levels.append((prefixes[starts], mass, center, count))
+    node_codes = np.empty(n, dtype=np.int64)
+    node_codes[order] = codes
+
+    forces = np.zeros((n, 2))
+    nodes = np.arange(n)
+    cells = np.zeros(n, dtype=np.int64)
+    for level in range(tree_depth + 1):
+        prefixes, mass, center, count = levels[level]
+        inside = (node_codes[nodes] >> (2 * (tree_depth - level))) == prefixes[cells]
+        # The cell holds only the node itself.
+        alone = inside & (count[cells] == 1)
+        nodes, cells, inside = nodes[~alone], cells[~alone], inside[~alone]
+        delta = positions[nodes] - center[cells]
+        distance2 = (delta ** 2).sum(axis=1)
+        cell_mass = mass[cells]
+        if level == tree_depth:
+            # The smallest cells are never opened: leave the node out of the center of its own, which
+            # moves the center to c - m (x - c) / (M - m) and scales x - c by M / (M - m).
+            own_mass = cell_mass - np.where(inside, masses[nodes], 0)
+            delta *= np.where(inside, cell_mass / np.maximum(own_mass, 1e-12), 1)[:, None]
+            distance2 = (delta ** 2).sum(axis=1)
+            cell_mass = own_mass
+            accept = cell_mass > 0
+        else:
+            cell_size = size / (1 << level)
+            accept = ~inside & ((count[cells] == 1) | (cell_size * cell_size < theta * theta * distance2))
+        push = masses[nodes[accept]] * cell_mass[accept] / np.maximum(distance2[accept], 1e-9)
+        forces[:, 0] += np.bincount(nodes[accept], weights=push * delta[accept, 0], minlength=n)
+        forces[:, 1] += np.bincount(nodes[accept], weights=push * delta[accept, 1], minlength=n)
+        if level == tree_depth:
+            break
+
+        # Open the other cells into their children at the next level, which are contiguous there.
+        nodes, cells = nodes[~accept], cells[~accept]
+        children = levels[level + 1][0]
+        first = np.searchsorted(children, prefixes[cells] << 2)
+        last = np.searchsorted(children, (prefixes[cells] + 1) << 2)
+        counts = last - first
+        total = int(counts.sum())
+        nodes = np.repeat(nodes, counts)
+        cells = np.repeat(first, counts) + np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        if not total:
+            break
+    return forces
+
+# Interleave the 16 low bits of every value with zeros, so that x | (y << 1) is the Morton code of
+# the cell (x, y).
+def spread_bits(values):
+    values = values & 0xFFFF
+    values = (values | (values << 8)) & 0x00FF00FF
+    values = (values | (values << 4)) & 0x0F0F0F0F
+    values = (values | (values << 2)) & 0x33333333
+    values = (values | (values << 1)) & 0x55555555
+    return values
+
+# Match nodes of a graph (edges src -> dst in both directions, with multiplicities weights, and
+# nodes standing for masses original nodes) with one of their neighbors, to merge them.
+# In every round each unmatched node proposes to the unmatched neighbor it shares the heaviest edge
+# with relative to their masses (ties broken at random), and the nodes proposing to each other are
+# matched, until no unmatched neighbors are left or after the given number of rounds.
+# Returns the coarse node every node is merged into, and the number of coarse nodes.
+def coarsen(n, src, dst, weights, masses, rng, rounds=10):
+    partner = np.full(n, -1, dtype=np.int64)
+    # Both directions of an edge get the same random tie breaker, so that ties do not keep nodes
+    # from proposing to each other.
+    keys = (np.minimum(src, dst) << 32) | np.maximum(src, dst)
+    mixed = (keys.astype(np.uint64) ^ np.uint64(rng.integers(1 << 62))) * np.uint64(0x9E3779B97F4A7C15)
+    noise = (mixed >> np.uint64(11)).astype(np.float64) / 2.0 ** 53 * 1e-6
+    for i in range(rounds):
+        free = (partner[src] < 0) & (partner[dst] < 0) & (src != dst)
+        if not free.any():
+            break
+        u, v = src[free], dst[free]
+        score = weights[free] / (masses[u] * masses[v]) + noise[free]
+        # The best neighbor of every node is the first of its edges by decreasing score.
+        order = np.lexsort((-score, u))
+        u, v = u[order], v[order]
+        first = np.concatenate(([True], u[1:] != u[:-1]))
+        proposal = np.full(n, -1, dtype=np.int64)
+        proposal[u[first]] = v[first]
+        proposers = u[first]
+        mutual = proposal[proposal[proposers]] == proposers
+        partner[proposers[mutual]] = proposal[proposers[mutual]]
+
+    # Number the pairs by their lower node and the unmatched nodes by themselves.
+    leader = np.where((partner >= 0) & (partner < np.arange(n)), partner, np.arange(n))
+    is_leader = leader == np.arange(n)
+    number = np.cumsum(is_leader) - 1
+    return number[leader], int(is_leader.sum())
+
+# Build the coarse graph of the merged nodes: the edges between nodes merged into different coarse
+# nodes add up into weighted edges, and the masses of merged nodes add up.
+def coarse_graph(parent, coarse_n, src, dst, weights, masses):
+    u, v = parent[src], parent[dst]
+    keep = u != v
+    keys = (u[keep] << 32) | v[keep]
+    order = np.argsort(keys, kind="stable")
+    keys, edge_weights = keys[order], weights[keep][order]
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1]))) if len(keys) else np.zeros(0, dtype=np.int64)
+    coarse_weights = np.add.reduceat(edge_weights, starts) if len(keys) else np.zeros(0)
+    keys = keys[starts]
+    coarse_masses = np.bincount(parent, weights=masses, minlength=coarse_n)
+    return coarse_n, keys >> 32, keys & 0xFFFFFFFF, coarse_weights, coarse_masses
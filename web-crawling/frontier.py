@@ -0,0 +1,234 @@
+import heapq
+from array import array
+from urllib.parse import urlsplit
+
+# Crawl frontiers: the queue of url ids still to be visited, each with its own selection policy.
+# Every frontier has the same interface:
+#   push(url_id)                 add the start url
+#   push_links(parent, url_ids)  add the unvisited links just found on the visited page parent
+#   pop()                        remove and return the next url id to visit (IndexError if empty)
+#   len(frontier)                the number of entries left (which may include visited ids)
+# A url may be pushed more than once and may be popped after it was visited; the crawler skips
+# visited ids when it pops them.
+
+# Check whether the host of a url is one of the domains or a subdomain of one of them,
+# e.g. ".caltech.edu" matches caltech.edu and www.its.caltech.edu but not caltech.edu.evil.com.
+# The domain can be a single domain or a list of domains.
+def in_scope(url, domain):
+    try:
+        host = urlsplit(url).hostname
+    except ValueError:
+        return False
+    if not host:
+        return False
+    for suffix in ([domain] if isinstance(domain, str) else domain):
+        suffix = suffix.lower().lstrip(".")
+        if host == suffix or host.endswith("." + suffix):
+            return True
+    return False
+
+# A FIFO queue of ints stored in a flat array instead of a deque of int objects.
+class IntQueue:
+    def __init__(self, items=()):
+        self.items = array('q', items)
+        self.head = 0
+
+    def append(self, item):
+        self.items.append(item)
+
+    def popleft(self):
+        if self.head >= len(self.items):
+            raise IndexError("pop from an empty queue")
+        item = self.items[self.head]
+        self.head += 1
+        # Drop the consumed front of the array once it makes up most of it.
+        if self.head > 1024 and self.head * 2 > len(self.items):
+            del self.items[:self.head]
+            self.head = 0
+        return item
+
+    def __len__(self):
+        return len(self.items) - self.head
+
+# Breadth-first search: visit urls in the order they were found.
+class BFSFrontier:
+    def __init__(self, table=None):
+        self.queue = IntQueue()
+
+    def push(self, url_id):
+        self.queue.append(url_id)
+
+    def push_links(self, parent, url_ids):
+        for url_id in url_ids:
+            self.queue.append(url_id)
+
+    def pop(self):
+        return self.queue.popleft()
+
+    def __len__(self):
+        return len(self.queue)
+
+# Per-host round robin: keep a BFS queue per host and take one url from each host in turn, so
+# a single large host cannot take up the whole crawl budget.
+class HostRoundRobinFrontier:
+    def __init__(self, table):
+        self.table = table
+        self.queues = {}
+        self.hosts = IntQueue()
+        self.host_ids = {}
+        self.host_names = []
+        self.size = 0
+
+    def push(self, url_id):
+        host = urlsplit(self.table.url(url_id)).netloc.lower()
+        host_id = self.host_ids.get(host)
+        if host_id is None:
+            host_id = self.host_ids[host] = len(self.host_names)
+            self.host_names.append(host)
+        queue = self.queues.get(host_id)
+        if queue is None:
+            queue = self.queues[host_id] = IntQueue()
+        # A host joins the rotation when its queue becomes non-empty.
+        if not queue:
+            self.hosts.append(host_id)
+        queue.append(url_id)
+        self.size += 1
+
+    def push_links(self, parent, url_ids):
+        for url_id in url_ids:
+            self.push(url_id)
+
+    def pop(self):
+        host_id = self.hosts.popleft()
+        queue = self.queues[host_id]
+        url_id = queue.popleft()
+        if queue:
+            self.hosts.append(host_id)
+        else:
+            del self.queues[host_id]
+        self.size -= 1
+        return url_id
+
+    def __len__(self):
+        return self.size
+
+# OPIC (On-line Page Importance Computation): every page holds some cash, starting with all of
+# it on the start url. When a page is visited, its cash is split evenly between the links found
+# on it, and the queued url with the most cash is visited next. The cash a page collects is an
+# online estimate of its PageRank, so important pages are reached early.
+# The max-heap is kept lazily: an entry is ignored when it no longer matches the url's cash.
+class OPICFrontier:
+    def __init__(self, table=None):
+        self.cash = array('d')
+        # Per id: 0 if never pushed, 1 while queued, 2 once popped.
+        self.state = bytearray()
+        self.heap = []
+        self.queued = 0
+
+    def push(self, url_id):
+        self.add_cash(url_id, 1.0)
+
+    def push_links(self, parent, url_ids):
+        # The parent has been visited, so it leaves the queue if it was not popped (as when a
+        # checkpoint is replayed).
+        self.add_cash(parent, 0.0)
+        if self.state[parent] == 1:
+            self.state[parent] = 2
+            self.queued -= 1
+        if not url_ids:
+            return
+        # Hand the parent's cash on to its links.
+        share = self.cash[parent] / len(url_ids)
+        self.cash[parent] = 0.0
+        for url_id in url_ids:
+            self.add_cash(url_id, share)
+
+    def add_cash(self, url_id, amount):
+        grow(self.cash, url_id, 0.0)
+        if url_id >= len(self.state):
+            self.state.extend(bytes(url_id + 1 - len(self.state)))
+        self.cash[url_id] += amount
+        # Popped urls keep collecting cash to pass on once their links are pushed.
+        if self.state[url_id] == 2:
+            return
+        if self.state[url_id] == 0:
+            self.state[url_id] = 1
+            self.queued += 1
+        heapq.heappush(self.heap, (-self.cash[url_id], url_id))
+
+    def pop(self):
+        while self.heap:
+            priority, url_id = heapq.heappop(self.heap)
+            # Skip entries superseded by a later push of the same url.
+            if self.state[url_id] == 1 and -priority == self.cash[url_id]:
+                self.state[url_id] = 2
+                self.queued -= 1
+                return url_id
+        raise IndexError("pop from an empty frontier")
+
+    def __len__(self):
+        return self.queued
+
+# Depth-bounded breadth-first search: visit urls in order of their link distance from the start
+# url and never queue urls more than max_depth links away. Urls are kept in a bucket per depth.
+class DepthBoundedFrontier:
+    def __init__(self, table=None, max_depth=3):
+        self.max_depth = max_depth
+        self.depth = array('q')
+        self.buckets = [IntQueue() for _ in range(max_depth + 1)]
+        self.current = 0
+        self.size = 0
+
+    def push(self, url_id):
+        self.add(url_id, 0)
+
+    def push_links(self, parent, url_ids):
+        grow(self.depth, parent, -1)
+        depth = self.depth[parent] + 1
+        if depth > self.max_depth:
+            return
+        for url_id in url_ids:
+            self.add(url_id, depth)
+
+    def add(self, url_id, depth):
+        # Keep the shortest depth a url was found at.
+        grow(self.depth, url_id, -1)
+        if 0 <= self.depth[url_id] <= depth:
+            return
+        self.depth[url_id] = depth
+        self.buckets[depth].append(url_id)
+        self.current = min(self.current, depth)
+        self.size += 1
+
+    def pop(self):
+        while self.current <= self.max_depth:
+            bucket = self.buckets[self.current]
+            if bucket:
+                self.size -= 1
+                return bucket.popleft()
+            self.current += 1
+        raise IndexError("pop from an empty frontier")
+
+    def __len__(self):
+        return self.size
+
+# The frontier policies by name.
+frontier_policies = {
+    "bfs": BFSFrontier,
+    "round-robin": HostRoundRobinFrontier,
+    "opic": OPICFrontier,
+    "depth": DepthBoundedFrontier,
+}
+
+# Make a frontier for the named policy over urls interned in the given table.
+def new_frontier(policy, table, max_depth=None):
+    if policy not in frontier_policies:
+        raise ValueError("unknown frontier policy " + repr(policy) + ", expected one of " + ", ".join(frontier_policies))
+    if policy == "depth":
+        return DepthBoundedFrontier(table, 3 if max_depth is None else max_depth)
+    return frontier_policies[policy](table)
+
+# Grow an array with the fill value so that it has an entry for the index.
+def grow(values, index, fill):
+    if index >= len(values):
+        values.extend([fill] * (index + 1 - len(values)))
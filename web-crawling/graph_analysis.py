@@ -1,60 +1,96 @@
 
 import os
-import pickle
-import networkx as nx
 import matplotlib.pyplot as plt
-from matplotlib.backends.backend_pdf import PdfPages
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from PyPDF2 import PdfMerger
-
-temp_dir = "temp"
-temp_plots_pdf = "temp/plots.pdf"
-temp_text_pdf = "temp/text.pdf"
+from csr_graph import load_csr_graph
+from shortest_paths import path_statistics, path_statistics_lines
+from triangles import clustering_statistics
+from metrics_cache import MetricsCache
+from distributions import degree_cdf
+from report import compute_metrics, write_report, run_tasks, figure_page, text_page
 
 def main():
-    analyze_graph('out/caltech_graph_2000.pkl', 'out/caltech_graph_2000_analysis.pdf')
-
-def analyze_graph(graph_pkl_file, analysis_pdf_save_file):
-    # Create the temp dir if it doesn't exist
-    os.makedirs(temp_dir, exist_ok=True)
-
-    # Create a PDF file for saving the plots
-    pdf = PdfPages(temp_plots_pdf)
-
-    # Load the graph from the pickle file
-    G = None
+    analyze_graph('out/caltech_graph_2000.csr', 'out/caltech_graph_2000_analysis.pdf')
+
+# The degrees, clustering and shortest path statistics are cached next to the graph file (see
+# metrics_cache.py) and reused by later analyses of the same graph, unless use_cache is False.
+# metric_params maps "clustering_statistics" and "path_statistics" to the keyword arguments they
+# are computed with (like exact, samples and seed), which are part of their cache keys.
+# The metrics and the pages of the report are computed in workers processes (by default one per
+# core) and written straight to the report (see report.py), so that analyses can run at once.
+def analyze_graph(graph_file, analysis_pdf_save_file, use_cache=True, workers=None, metric_params=None):
+    # Load the graph from the CSR directory (memory-mapped) or pickle file
+    csr = None
     try:
-        with open(graph_pkl_file, 'rb') as f:
-            G = pickle.load(f)
+        csr = load_csr_graph(graph_file)
     except:
         pass
-    if (G is None):
-        print("Error: Graph could not be loaded from", graph_pkl_file)
+    if (csr is None):
+        print("Error: Graph could not be loaded from", graph_file)
         return
-    print("Loaded graph with n =", G.number_of_nodes(), "nodes and m =", G.number_of_edges(), "edges from", graph_pkl_file)
+    n = csr.number_of_nodes()
+    m = csr.number_of_edges()
+    print("Loaded graph with n =", n, "nodes and m =", m, "edges from", graph_file)
+    metrics = MetricsCache.for_graph(graph_file, csr) if use_cache else MetricsCache(None, None)
+
+    # Calculate the degrees, and the clustering and diameters of the undirected graph (which
+    # both treat the graph as undirected), from the CSR arrays of the graph. The clustering and
+    # diameters spread their work over their own pools of workers.
+    metric_params = metric_params or {}
+    values = compute_metrics(metrics, {
+        "out_degrees": (out_degrees, (csr,)),
+        "in_degrees": (in_degrees, (csr,)),
+        "clustering_statistics": (clustering_statistics, (csr,), metric_params.get("clustering_statistics", {})),
+        "path_statistics": (path_statistics, (csr,), metric_params.get("path_statistics", {})),
+    }, workers, pooled=("clustering_statistics", "path_statistics"))
+    out_degree_counts = values["out_degrees"]
+    in_degree_counts = values["in_degrees"]
+    clustering = values["clustering_statistics"]
+    path_lines = path_statistics_lines(values["path_statistics"], n)
 
-    # Generate out-degree histogram
-    out_degree_counts = [G.out_degree(node) for node in G.nodes()]
-    plt.figure(figsize=(8, 4))
-    plt.hist(out_degree_counts, bins=range(0, max(out_degree_counts)+1), alpha=1, color='b', label='Out-degrees')
-    plt.title("Distribution of hyperlinks pointing from a page (out-degrees)")
-    plt.xlabel("Number of out hyperlinks")
-    plt.ylabel("Number of pages")
-    pdf.savefig()
-    plt.close()
+    # Generate out-degree and in-degree CDFs
+    out_degrees_x, out_degree_cdf = degree_cdf(out_degree_counts)
+    in_degrees_x, in_degree_cdf = degree_cdf(in_degree_counts)
+
+    pages = [
+        (text_page, (draw_summary, n, m, clustering["transitivity"], clustering["average_clustering"], path_lines)),
+        (figure_page, (plot_degree_histogram, out_degree_counts, 'b', 'Out-degrees', "Distribution of hyperlinks pointing from a page (out-degrees)", "Number of out hyperlinks")),
+        (figure_page, (plot_degree_histogram, in_degree_counts, 'r', 'In-degrees', "Distribution of hyperlinks pointing to a page (in-degrees)", "Number of in hyperlinks")),
+        (figure_page, (plot_degree_histograms, out_degree_counts, in_degree_counts)),
+        (figure_page, (plot_cdf, out_degrees_x, out_degree_cdf, "CDF of hyperlinks pointing from a page (out-degrees)", "Number of out hyperlinks", "Probability of having x or fewer out hyperlinks")),
+        (figure_page, (plot_cdf, in_degrees_x, in_degree_cdf, "CDF of hyperlinks pointing to a page (in-degrees)", "Number of in hyperlinks", "Probability of having x or fewer in hyperlinks")),
+    ]
+    write_report(pages, analysis_pdf_save_file, workers)
+
+# Analyze several graphs at once, jobs being (graph_file, analysis_pdf_save_file) pairs, one
+# analysis per worker process. An analysis that fails does not stop the others.
+# Returns whether each analysis succeeded.
+def analyze_graphs(jobs, use_cache=True, workers=None):
+    return run_tasks([(analyze_job, (graph_file, save_file, use_cache)) for graph_file, save_file in jobs], workers)
+
+def analyze_job(graph_file, analysis_pdf_save_file, use_cache):
+    try:
+        analyze_graph(graph_file, analysis_pdf_save_file, use_cache, workers=1)
+    except Exception as e:
+        print("Error: Analysis of", graph_file, "failed:", repr(e))
+        return False
+    return os.path.exists(analysis_pdf_save_file)
+
+def out_degrees(csr):
+    return csr.out_degree().tolist()
 
-    # Generate in-degree histogram
-    in_degree_counts = [G.in_degree(node) for node in G.nodes()]
+def in_degrees(csr):
+    return csr.in_degree().tolist()
+
+# Generate a degree histogram
+def plot_degree_histogram(degree_counts, color, label, title, xlabel):
     plt.figure(figsize=(8, 4))
-    plt.hist(in_degree_counts, bins=range(0, max(in_degree_counts)+1), alpha=1, color='r', label='In-degrees')
-    plt.title("Distribution of hyperlinks pointing to a page (in-degrees)")
-    plt.xlabel("Number of in hyperlinks")
+    plt.hist(degree_counts, bins=range(0, max(degree_counts)+1), alpha=1, color=color, label=label)
+    plt.title(title)
+    plt.xlabel(xlabel)
     plt.ylabel("Number of pages")
-    pdf.savefig()
-    plt.close()
 
-    # Generate overlayed out-degree and in-degree histogram
+# Generate overlayed out-degree and in-degree histogram
+def plot_degree_histograms(out_degree_counts, in_degree_counts):
     plt.figure(figsize=(8, 4))
     plt.hist(out_degree_counts, bins=range(0, max(out_degree_counts)+1), alpha=0.5, color='b', label='Out-degrees')
     plt.hist(in_degree_counts, bins=range(0, max(in_degree_counts)+1), alpha=0.5, color='r', label='In-degrees')
@@ -62,38 +98,20 @@ def analyze_graph(graph_pkl_file, analysis_pdf_save_file):
     plt.xlabel("Number of hyperlinks")
     plt.ylabel("Number of pages")
     plt.legend()
-    pdf.savefig()
-    plt.close()
 
-    # Generate out-degree and in-degree CDFs
-    out_degree_cdf = generate_cdf_func(out_degree_counts)
-    in_degree_cdf = generate_cdf_func(in_degree_counts)
-
-    # Visualize the out-degree CDF
-    plot_cdf(out_degree_cdf, 0, max(out_degree_counts))
-    plt.title("CDF of hyperlinks pointing from a page (out-degrees)")
-    plt.xlabel("Number of out hyperlinks")
-    plt.ylabel("Probability of having x or fewer out hyperlinks")
-    pdf.savefig()
-    plt.close()
-
-    # Visualize the in-degree CDF
-    plot_cdf(in_degree_cdf, 0, max(in_degree_counts))
-    plt.title("CDF of hyperlinks pointing to a page (in-degrees)")
-    plt.xlabel("Number of in hyperlinks")
-    plt.ylabel("Probability of having x or fewer in hyperlinks")
-    pdf.savefig()
-    plt.close()
-
-    # Close the graph PDF
-    pdf.close() 
-
-    # Open the PDF file for writing text
-    c = canvas.Canvas(temp_text_pdf, pagesize=letter)
+# Visualize a degree CDF
+def plot_cdf(degrees, cdf, title, xlabel, ylabel):
+    plt.plot(degrees, cdf)
+    plt.title(title)
+    plt.xlabel(xlabel)
+    plt.ylabel(ylabel)
+
+# Write the description of the graph and its clustering and diameter analysis on the canvas c.
+def draw_summary(c, n, m, global_CC, avg_CC, path_lines):
     y = 10 * 72 # 10 inches in points (top of the page)
 
     # Add the selection policy to the PDF
-    c.drawString(100, y, "The Caltech Graph has n = " + str(G.number_of_nodes()) + " nodes and m = " + str(G.number_of_edges()) + " edges.")
+    c.drawString(100, y, "The Caltech Graph has n = " + str(n) + " nodes and m = " + str(m) + " edges.")
     y -= 15
     c.drawString(100, y, "It was generated using the following selection policy:")
     y -= 30
@@ -102,72 +120,23 @@ def analyze_graph(graph_pkl_file, analysis_pdf_save_file):
         y -= 15
     y -= 50
 
-    # Treat the graph as undirected for clustering and diameter calculations
-    G_undirected = G.to_undirected()
+    # Treat the graph as undirected for clustering and diameter calculations (which both do)
     c.drawString(100, y, "Clustering and Diameter analysis (treating the graph as undirected)")
     y -= 30
 
-    # Calculate the global and average clustering coefficients of the undirected graph
-    global_CC = nx.transitivity(G_undirected)
-    avg_CC = nx.average_clustering(G_undirected)
+    # Output the global and average clustering coefficients of the undirected graph
     c.drawString(100, y, "Global clustering coefficient: " + str(global_CC))
     y -= 20
     c.drawString(100, y, "Average clustering coefficient: " + str(avg_CC))
     y -= 30
 
-    # Calculate the maximum and average diameters of the undirected graph
-    max_diameter = nx.diameter(G_undirected)
-    avg_diameter = nx.average_shortest_path_length(G_undirected)
-    c.drawString(100, y, "Maximum diameter: " + str(max_diameter))
-    y -= 20
-    c.drawString(100, y, "Average diameter: " + str(avg_diameter))
-    y -= 30
-
-    # Save text PDF
-    c.save()
-
-    # Combine the plots and text into a single PDF
-    with open(analysis_pdf_save_file, "wb") as f:
-        pdfs = [temp_text_pdf, temp_plots_pdf]
-        merger = PdfMerger()
-        for pdf in pdfs:
-            merger.append(pdf)
-        merger.write(f)
-        merger.close()
-
-    os.remove(temp_plots_pdf)
-    os.remove(temp_text_pdf)
-    try:
-        os.rmdir(temp_dir)
-    except:
-        pass
-
+    # Output the maximum and average diameters of the undirected graph, on its largest
+    # connected component if it is not connected
+    for line in path_lines:
+        c.drawString(100, y, line)
+        y -= 20
+    y -= 10
 
-# Generates a CDF function from a list of counts.
-def generate_cdf_func(counts):
-    counts = sorted(counts)
-    max_val = counts[-1]
-    n = len(counts)
-    set_cdf = []
-    count = 0
-    for i in range(max_val):
-        while counts[count] <= i and count < n:
-            count += 1
-        set_cdf.append(count/n)
-    def cdf(x):
-        if (x < 0):
-            return 0.0
-        if (x >= max_val):
-            return 1.0
-        return set_cdf[x]
-    return cdf
-
-# Plots the CDF of a function given the domain range of the CDF.
-def plot_cdf(cdf, min, max):
-    x = range(min, max + 1)
-    y = [cdf(i) for i in x]
-    plt.plot(x, y)
-    
 # Description of selection policy
 selection_policy = [
     "Rules:",
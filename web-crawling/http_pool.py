@@ -0,0 +1,142 @@
+import threading
+import http.client
+from urllib.parse import urlsplit, urljoin
+
+# Statuses after which the request is repeated against the url in the Location header.
+redirect_statuses = (301, 302, 303, 307, 308)
+
+# A finished HTTP response: the real (redirected) url, status, headers and raw body bytes.
+# The body is empty if it was streamed, and truncated is set if the stream was stopped early.
+class PooledResponse:
+    def __init__(self, url, status, headers, body, truncated=False):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.truncated = truncated
+
+# A pool of persistent keep-alive HTTP/HTTPS connections, kept per host and shared between threads.
+# A connection is checked out for one request at a time and returned to the pool once its
+# response has been read completely, unless the server asked to close it.
+class ConnectionPool:
+    def __init__(self, timeout=2, max_idle_per_host=8, max_redirects=5, chunk_size=16384):
+        self.timeout = timeout
+        self.max_idle_per_host = max_idle_per_host
+        self.max_redirects = max_redirects
+        self.chunk_size = chunk_size
+        self.idle = {}
+        self.lock = threading.Lock()
+
+    # GET the url, following redirects, and return a PooledResponse.
+    # If open_stream is given, it is called with the status and headers of the final response
+    # and returns either None to skip the body, or a function that is handed the body chunk by
+    # chunk as it arrives and returns True to stop reading early.
+    # Raises http.client.HTTPException or OSError if the request cannot be completed.
+    def get(self, url, headers=None, open_stream=None):
+        for _ in range(self.max_redirects + 1):
+            response = self.request(url, headers or {}, open_stream)
+            location = response.headers.get("location")
+            if response.status not in redirect_statuses or location is None:
+                return response
+            url = urljoin(url, location)
+        raise http.client.HTTPException("too many redirects")
+
+    # Send a single GET on a pooled connection and return a PooledResponse.
+    def request(self, url, headers, open_stream=None):
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        # A reused connection may have been closed by the server while idle, so retry once on a
+        # fresh connection before giving up.
+        conn, reused = self.checkout(key)
+        while True:
+            try:
+                conn.request("GET", path, headers=headers)
+                response = conn.getresponse()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if not reused:
+                    raise
+                conn, reused = self.connect(key), False
+            except:
+                conn.close()
+                raise
+        response_headers = {k.lower(): v for k, v in response.getheaders()}
+
+        # Read the body whole, or stream it to the caller's writer.
+        body = b""
+        complete = True
+        try:
+            if open_stream is None or response.status in redirect_statuses:
+                body = response.read()
+            else:
+                write = open_stream(response.status, response_headers)
+                if write is not None:
+                    complete = self.stream(response, write)
+                elif response.length == 0:
+                    response.read()
+                else:
+                    # Skipped bodies are not downloaded, so the connection cannot be reused.
+                    complete = False
+        except:
+            conn.close()
+            raise
+
+        # Only keep the connection around if the body was read completely and the server will
+        # not close it.
+        if not complete or response.will_close:
+            conn.close()
+        else:
+            self.checkin(key, conn)
+        return PooledResponse(url, response.status, response_headers, body, not complete)
+
+    # Hand the body of the response to write chunk by chunk as it arrives.
+    # Return whether the whole body was read (False if write asked to stop early).
+    def stream(self, response, write):
+        while True:
+            chunk = response.read1(self.chunk_size)
+            if not chunk:
+                # Finish the response so the connection can be used for the next request.
+                response.read()
+                return True
+            if write(chunk):
+                return False
+
+    # Take an idle connection to the host out of the pool, or open a new one.
+    # Return the connection and whether it was reused.
+    def checkout(self, key):
+        with self.lock:
+            idle = self.idle.get(key)
+            if idle:
+                return idle.pop(), True
+        return self.connect(key), False
+
+    # Return a connection to the pool, closing it if the host already has enough idle ones.
+    def checkin(self, key, conn):
+        with self.lock:
+            idle = self.idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    # Open a new connection to the host.
+    def connect(self, key):
+        scheme, netloc = key
+        if scheme == "https":
+            return http.client.HTTPSConnection(netloc, timeout=self.timeout)
+        if scheme == "http":
+            return http.client.HTTPConnection(netloc, timeout=self.timeout)
+        raise http.client.HTTPException("unsupported scheme " + scheme)
+
+    # Close every idle connection.
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
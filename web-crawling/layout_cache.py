@@ -0,0 +1,74 @@
+import os
+import weakref
+import networkx as nx
+from metrics_cache import MetricsCache, graph_fingerprint
+from force_layout import force_layout
+
+# Number of layouts kept in memory, the least recently used being dropped first.
+max_memory_layouts = 64
+
+# Layouts that are random unless given a seed. They get seed 0 by default, so that a graph is drawn
+# the same way in every plot and every run, and their positions can be cached.
+seeded_layouts = ("spring", "random", "force")
+
+# Layouts of this project by name, looked up before those of NetworkX.
+layout_algorithms = {"force": force_layout}
+
+# The layouts computed in this process, by cache key.
+memory_layouts = {}
+
+# The fingerprints of the graphs laid out in this process, with their numbers of nodes and edges
+# when they were taken, by graph (as long as it exists).
+fingerprints = weakref.WeakKeyDictionary()
+
+# Get the positions of the nodes of G (a node -> position dict, as nx.draw takes) computed by
+# nx.<algorithm>_layout(G, **params) (or by force_layout for "force", which scales to graphs of
+# thousands of nodes), computing each layout only once per graph and parameters.
+# Layouts are cached in memory, keyed by the fingerprint of the graph, the algorithm and its
+# parameters, so that every plot of the same graph reuses the same positions. Given a cache_dir
+# (like layouts_dir(graph_file)) they are also pickled there (see metrics_cache.py) and reused by
+# later runs.
+# Errors of the layout (like nx.planar_layout on a graph that is not planar) are raised and not
+# cached.
+def get_layout(G, algorithm="spring", cache_dir=None, **params):
+    if algorithm in seeded_layouts:
+        params.setdefault("seed", 0)
+    compute = layout_algorithms.get(algorithm) or getattr(nx, algorithm + "_layout", None)
+    if compute is None:
+        raise ValueError("unknown layout algorithm " + repr(algorithm))
+
+    cache = MetricsCache(cache_dir, layout_fingerprint(G))
+    name = "layout_" + algorithm
+    key = cache.key(name, params)
+    if key in memory_layouts:
+        # Move the layout to the end, as the most recently used.
+        pos = memory_layouts[key] = memory_layouts.pop(key)
+        return pos
+
+    pos = cache.get(name, params, lambda: compute(G, **params))
+    memory_layouts[key] = pos
+    while len(memory_layouts) > max_memory_layouts:
+        memory_layouts.pop(next(iter(memory_layouts)))
+    return pos
+
+# Get the fingerprint of G (see metrics_cache.py), which converts it to CSR, only once per graph
+# object: it is taken again only if the graph gained or lost nodes or edges since. A graph changed
+# in place without changing its numbers of nodes and edges keeps its fingerprint, so it is drawn
+# with the positions of the graph it was.
+def layout_fingerprint(G):
+    size = (G.number_of_nodes(), G.number_of_edges())
+    known = fingerprints.get(G)
+    if known is None or known[0] != size:
+        known = fingerprints[G] = (size, graph_fingerprint(G))
+    return known[1]
+
+# Get the directory the layouts of a graph loaded from graph_file are kept in, next to it in
+# <graph_file without extension>.layouts, like its metrics.
+def layouts_dir(graph_file):
+    return os.path.splitext(os.path.normpath(graph_file))[0] + ".layouts"
+
+# Forget the layouts kept in memory, and delete those in cache_dir (if given).
+def clear_layouts(cache_dir=None):
+    memory_layouts.clear()
+    fingerprints.clear()
+    MetricsCache(cache_dir, None).clear()
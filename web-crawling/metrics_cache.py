@@ -0,0 +1,127 @@
+import os
+import json
+import pickle
+import hashlib
+import numpy as np
+from csr_graph import CSRGraph, to_csr
+
+# Bump to invalidate every cached metric when the way metrics are computed changes.
+cache_version = 1
+
+# What MetricsCache.lookup returns for metrics that are not cached (None being a valid metric).
+missing = object()
+
+# A content-addressed cache of the metrics computed on graphs, so that reports made again on the
+# same graph reuse them instead of recomputing them.
+# Every metric is pickled to <key>.pkl in cache_dir, where the key hashes the fingerprint of the
+# graph, the name of the metric and its parameters. A graph that changes gets a new fingerprint,
+# so the metrics of its old version are never reused; they are left to be evicted.
+# Reading an entry marks it as used, and once the entries take more than max_bytes (or there are
+# more than max_entries of them) the least recently used ones are deleted.
+# With cache_dir None nothing is cached and every metric is computed.
+class MetricsCache:
+    def __init__(self, cache_dir, fingerprint, max_bytes=256 * 1024 * 1024, max_entries=1000):
+        self.cache_dir = cache_dir
+        self.fingerprint = fingerprint
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    # Get the cache of the metrics of a graph loaded from graph_file, kept next to it in
+    # <graph_file without extension>.metrics.
+    @classmethod
+    def for_graph(cls, graph_file, G, **options):
+        cache_dir = os.path.splitext(os.path.normpath(graph_file))[0] + ".metrics"
+        return cls(cache_dir, graph_fingerprint(G), **options)
+
+    def key(self, name, params):
+        text = json.dumps([cache_version, self.fingerprint, name, params], sort_keys=True, default=str)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    # Get the value of a metric with the given parameters (a JSON-serializable dict), computing it
+    # with compute() and caching it if it is not cached yet.
+    def get(self, name, params, compute):
+        value = self.lookup(name, params)
+        if value is missing:
+            value = compute()
+            self.store(name, params, value)
+        return value
+
+    # Get the cached value of a metric with the given parameters, or missing if it is not cached.
+    def lookup(self, name, params):
+        if self.cache_dir is None:
+            return missing
+        path = self.path(name, params)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+            os.utime(path)
+            self.hits += 1
+            return value
+        except FileNotFoundError:
+            pass
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            print("Warning: ignoring unreadable cached metric", name, "at", path)
+        self.misses += 1
+        return missing
+
+    # Cache the value of a metric with the given parameters.
+    def store(self, name, params, value):
+        if self.cache_dir is not None:
+            self.put(self.path(name, params), value)
+
+    def path(self, name, params):
+        return os.path.join(self.cache_dir, self.key(name, params) + ".pkl")
+
+    # Write an entry, through a temporary file so that readers never see a partial one.
+    def put(self, path, value):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = path + ".tmp%d" % os.getpid()
+            with open(temp_path, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+        except (OSError, pickle.PicklingError, TypeError, AttributeError) as e:
+            print("Warning: metric could not be cached at", path, "-", e)
+            return
+        self.evict()
+
+    # Delete the least recently used entries until the cache is within its limits.
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".pkl"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        total = sum(size for mtime, size, path in entries)
+        while entries and (total > self.max_bytes or len(entries) > self.max_entries):
+            mtime, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    # Delete every entry.
+    def clear(self):
+        if self.cache_dir is None or not os.path.isdir(self.cache_dir):
+            return
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".pkl"):
+                os.remove(entry.path)
+
+# Fingerprint a graph (NetworkX or CSRGraph) by hashing its CSR arrays, node labels and kind, so
+# that the same graph loaded from a pickle or from a CSR directory has the same fingerprint.
+def graph_fingerprint(G):
+    csr = G if isinstance(G, CSRGraph) else to_csr(G)
+    digest = hashlib.sha256()
+    digest.update(json.dumps({"directed": csr.directed, "multigraph": csr.multigraph, "n": csr.n, "m": csr.m}, sort_keys=True).encode("utf-8"))
+    digest.update(np.ascontiguousarray(csr.offsets, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(csr.neighbors, dtype=np.int64).tobytes())
+    if isinstance(csr.labels, np.ndarray):
+        digest.update(np.ascontiguousarray(csr.labels, dtype=np.int64).tobytes())
+    elif csr.labels is not None:
+        digest.update(json.dumps(list(csr.labels), default=repr).encode("utf-8"))
+    return digest.hexdigest()
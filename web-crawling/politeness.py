@@ -0,0 +1,167 @@
+import time
+import threading
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+import fetcher3
+
+# A token bucket: tokens refill at rate per second up to capacity, and every request takes one.
+# Requests made while the bucket is empty are not refused but scheduled: reserve() returns how
+# long the caller must wait for its token, so back-to-back requests end up spaced 1/rate apart.
+class TokenBucket:
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    # Take a token and return the number of seconds to wait before using it.
+    def reserve(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+# The parsed robots.txt of every host, fetched once per host through fetcher3's connection pool
+# and kept for ttl seconds. As with urllib's RobotFileParser, a robots.txt that is missing lets
+# everything be crawled and one that is forbidden (401/403) disallows the whole host.
+class RobotsCache:
+    def __init__(self, user_agent="Mozilla/5.0", ttl=24 * 60 * 60):
+        self.user_agent = user_agent
+        self.ttl = ttl
+        self.robots = {}
+        self.locks = {}
+        self.lock = threading.Lock()
+
+    # Check whether robots.txt allows the url to be fetched.
+    def allowed(self, url):
+        return self.get(url).can_fetch(self.user_agent, url)
+
+    # Get the Crawl-delay robots.txt sets for the url's host (None if it sets none).
+    def crawl_delay(self, url):
+        return self.get(url).crawl_delay(self.user_agent)
+
+    # Get the parsed robots.txt of the url's host, fetching it if it is not cached.
+    def get(self, url):
+        parts = urlsplit(url)
+        origin = parts.scheme + "://" + parts.netloc
+        with self.lock:
+            lock = self.locks.setdefault(origin, threading.Lock())
+        # Only one thread fetches the robots.txt of a host, the others wait for it.
+        with lock:
+            robots = self.robots.get(origin)
+            if robots is None or time.time() - robots.mtime() > self.ttl:
+                robots = self.robots[origin] = fetch_robots(origin + "/robots.txt")
+        return robots
+
+# A RobotFileParser that also reads fractional Crawl-delay values (like "Crawl-delay: 0.5"), which
+# urllib ignores as it only reads integers. The delays are read from the groups of User-agent
+# lines like urllib reads the rules: the first group naming the user agent applies, or else the
+# group of "*".
+class RobotsFile(RobotFileParser):
+    def __init__(self, url=""):
+        super().__init__(url)
+        self.delays = []
+
+    def parse(self, lines):
+        lines = list(lines)
+        super().parse(lines)
+        self.delays = crawl_delays(lines)
+
+    # Get the Crawl-delay for the user agent in seconds, or None if there is none.
+    def crawl_delay(self, useragent):
+        if not self.mtime():
+            return None
+        agent = useragent.split("/")[0].lower()
+        default = None
+        for agents, delay in self.delays:
+            for name in agents:
+                if name == "*":
+                    default = delay if default is None else default
+                elif name.lower() in agent:
+                    return delay
+        return default
+
+# Read the groups of a robots.txt as (user agents, Crawl-delay) pairs, the delay as a float in
+# seconds (None if the group sets none or an invalid one).
+def crawl_delays(lines):
+    groups = []
+    agents, delay, rules = [], None, False
+    for line in lines:
+        line = line.split("#", 1)[0].strip()
+        if ":" not in line:
+            continue
+        field, value = (part.strip() for part in line.split(":", 1))
+        field = field.lower()
+        if field == "user-agent":
+            # A User-agent line after the rules of a group starts the next group.
+            if rules:
+                groups.append((agents, delay))
+                agents, delay, rules = [], None, False
+            agents.append(value)
+        elif agents:
+            rules = True
+            if field == "crawl-delay":
+                try:
+                    delay = float(value)
+                except ValueError:
+                    delay = None
+                if delay is not None and not 0 <= delay < float("inf"):
+                    delay = None
+    if agents:
+        groups.append((agents, delay))
+    return groups
+
+# Fetch and parse a robots.txt.
+def fetch_robots(robots_url):
+    robots = RobotsFile(robots_url)
+    try:
+        response = fetcher3.pool.get(robots_url, {'User-Agent': 'Mozilla/5.0'})
+        if response.status in (401, 403):
+            robots.disallow_all = True
+        elif response.status == 200:
+            robots.parse(response.body.decode('utf-8', errors='ignore').splitlines())
+        else:
+            robots.allow_all = True
+    except KeyboardInterrupt:
+        raise
+    except:
+        robots.allow_all = True
+    robots.modified()
+    return robots
+
+# Keeps a crawl polite to every host: urls disallowed by the host's robots.txt are skipped, and
+# requests to a host are rate limited by a token bucket refilling at `rate` requests per second
+# (or one per Crawl-delay seconds if robots.txt asks for less). Hosts are throttled
+# independently, so a crawler that waits on one host keeps fetching from the others.
+class PolitenessScheduler:
+    def __init__(self, rate=1.0, burst=1, user_agent="Mozilla/5.0", robots_ttl=24 * 60 * 60):
+        self.rate = rate
+        self.burst = burst
+        self.robots = RobotsCache(user_agent, robots_ttl)
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    # Check robots.txt for the url and reserve the next request slot for its host.
+    # Return whether the url may be fetched and the number of seconds to wait before fetching it.
+    # This may fetch the host's robots.txt, so it blocks.
+    def reserve(self, url):
+        if not self.robots.allowed(url):
+            return False, 0.0
+        host = urlsplit(url).netloc
+        with self.lock:
+            bucket = self.buckets.get(host)
+            if bucket is None:
+                rate = self.rate
+                delay = self.robots.crawl_delay(url)
+                if delay:
+                    rate = min(rate, 1.0 / float(delay))
+                bucket = self.buckets[host] = TokenBucket(rate, self.burst)
+            return True, bucket.reserve()
+
+    # Wait until the url may be fetched, returning False if robots.txt disallows it.
+    def wait(self, url):
+        allowed, delay = self.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+        return allowed
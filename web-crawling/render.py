@@ -0,0 +1,112 @@
+import numpy as np
+import networkx as nx
+import matplotlib.pyplot as plt
+from matplotlib.colors import to_rgb
+from matplotlib.collections import LineCollection
+from csr_graph import CSRGraph, to_csr, undirected_csr
+
+# Graphs with more edges than this have their edges drawn into an image (see edge_image) instead
+# of as one vector path each, which keeps the PDFs small and fast to make and to open.
+raster_edges = 2000
+
+# Graphs with more nodes than this have their nodes rasterized, and are drawn without labels.
+raster_nodes = 2000
+
+# Graphs with more edges than this only have a random sample of this many of them drawn.
+max_drawn_edges = 200000
+
+# Directed graphs with at most this many edges get arrows (drawn by NetworkX, one artist per
+# edge), and the others plain lines.
+max_arrow_edges = 500
+
+# Number of pixels drawn at once by edge_image, which bounds its memory.
+chunk_pixels = 4 * 1000 * 1000
+
+# Draw a graph (NetworkX or CSRGraph) at the positions pos (node -> position), like nx.draw and
+# with its styling arguments, but with all the nodes as a single scatter plot and all the edges as
+# a single LineCollection, or above raster_edges edges a single image, where nx.draw makes one
+# artist per edge of a directed graph and one text per label. Above max_edges edges only a random
+# sample of max_edges of them (picked with seed) is drawn.
+def draw_graph(G, pos, ax=None, with_labels=False, node_size=300, node_color="#1f78b4", edgecolors=None, linewidths=None, cmap=None,
+               font_size=12, font_color="k", font_weight="normal", edge_color="k", width=1.0, alpha=None, max_edges=max_drawn_edges, seed=0):
+    ax = ax if ax is not None else plt.gca()
+    csr = G if isinstance(G, CSRGraph) else to_csr(G)
+    if csr.labels is None:
+        nodes = list(range(csr.n))
+    else:
+        nodes = csr.labels.tolist() if isinstance(csr.labels, np.ndarray) else list(csr.labels)
+    xy = np.array([pos[node] for node in nodes], dtype=np.float64).reshape(-1, 2)
+
+    # Fix the limits first, since the edge image covers them. Leave a margin for the nodes.
+    if csr.n:
+        low, high = xy.min(axis=0), xy.max(axis=0)
+        margin = np.maximum((high - low) * 0.05, 1e-3)
+        ax.set_xlim(low[0] - margin[0], high[0] + margin[0])
+        ax.set_ylim(low[1] - margin[1], high[1] + margin[1])
+
+    if csr.directed and csr.m <= max_arrow_edges and not isinstance(G, CSRGraph):
+        nx.draw_networkx_edges(G, pos, ax=ax, edge_color=edge_color, width=width, alpha=alpha, node_size=node_size)
+    else:
+        simple = undirected_csr(csr)
+        src = simple.sources().astype(np.int64)
+        dst = np.asarray(simple.neighbors, dtype=np.int64)
+        keep = src < dst
+        src, dst = src[keep], dst[keep]
+        if len(src) > max_edges:
+            print("Drawing a random sample of", max_edges, "of the", len(src), "edges")
+            sample = np.sort(np.random.default_rng(seed).choice(len(src), max_edges, replace=False))
+            src, dst = src[sample], dst[sample]
+        if len(src) > raster_edges and isinstance(edge_color, str):
+            figure = ax.get_figure()
+            box = ax.get_position()
+            shape = (max(int(box.height * figure.get_figheight() * figure.dpi), 1), max(int(box.width * figure.get_figwidth() * figure.dpi), 1))
+            image = edge_image(xy, src, dst, ax.get_xlim(), ax.get_ylim(), shape, edge_color, 1.0 if alpha is None else alpha, width * figure.dpi / 72)
+            ax.imshow(image, extent=(*ax.get_xlim(), *ax.get_ylim()), origin="lower", interpolation="nearest", aspect="auto", zorder=1)
+        else:
+            ax.add_collection(LineCollection(np.stack((xy[src], xy[dst]), axis=1), colors=edge_color, linewidths=width, alpha=alpha, zorder=1))
+
+    nodes_drawn = ax.scatter(xy[:, 0], xy[:, 1], s=node_size, c=node_color, cmap=cmap, edgecolors=edgecolors,
+                             linewidths=linewidths, alpha=alpha, zorder=2)
+    nodes_drawn.set_rasterized(csr.n > raster_nodes)
+
+    if with_labels and csr.n <= raster_nodes:
+        for node, (x, y) in zip(nodes, xy):
+            ax.text(x, y, str(node), fontsize=font_size, color=font_color, fontweight=font_weight, ha="center", va="center", zorder=3, clip_on=True)
+    ax.set_axis_off()
+
+# Draw the edges src[i] - dst[i] between the positions xy into an RGBA image of the given shape
+# (rows, columns) covering xlim x ylim, one row per pixel of height from the bottom.
+# Every edge marks one pixel per pixel of its length (and a square of width_px pixels around it for
+# lines wider than a pixel), in chunks of about chunk_pixels. A pixel crossed by c edges of opacity
+# a (scaled down for lines thinner than a pixel) gets opacity 1 - (1 - a)^c, as if they were
+# overlaid.
+def edge_image(xy, src, dst, xlim, ylim, shape, color, alpha, width_px):
+    rows, columns = shape
+    x = (xy[:, 0] - xlim[0]) / (xlim[1] - xlim[0]) * columns
+    y = (xy[:, 1] - ylim[0]) / (ylim[1] - ylim[0]) * rows
+    x0, y0, dx, dy = x[src], y[src], x[dst] - x[src], y[dst] - y[src]
+    steps = np.ceil(np.maximum(np.abs(dx), np.abs(dy))).astype(np.int64) + 1
+    thickness = max(int(round(width_px)), 1)
+    offsets = np.arange(thickness) - (thickness - 1) / 2
+
+    counts = np.zeros(rows * columns, dtype=np.int64)
+    ends = np.cumsum(steps)
+    bounds = np.searchsorted(ends, np.arange(chunk_pixels, ends[-1], chunk_pixels)) if len(ends) else []
+    bounds = np.unique(np.concatenate(([0], bounds, [len(steps)]))).astype(np.int64)
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        chunk_steps = steps[start:end]
+        edge = np.repeat(np.arange(start, end), chunk_steps)
+        # The fraction of the way along its edge of every pixel.
+        t = (np.arange(len(edge)) - np.repeat(np.cumsum(chunk_steps) - chunk_steps, chunk_steps)) / np.maximum(steps[edge] - 1, 1)
+        px, py = x0[edge] + t * dx[edge], y0[edge] + t * dy[edge]
+        for ox in offsets:
+            for oy in offsets:
+                column = np.floor(px + ox).astype(np.int64)
+                row = np.floor(py + oy).astype(np.int64)
+                inside = (column >= 0) & (column < columns) & (row >= 0) & (row < rows)
+                counts += np.bincount(row[inside] * columns + column[inside], minlength=rows * columns)
+
+    image = np.zeros((rows, columns, 4))
+    image[:, :, :3] = to_rgb(color)
+    image[:, :, 3] = 1 - (1 - alpha * min(width_px, 1.0)) ** counts.reshape(rows, columns)
+    return image
@@ -0,0 +1,79 @@
+import io
+import os
+import multiprocessing as mp
+import matplotlib.pyplot as plt
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+from PyPDF2 import PdfMerger
+from metrics_cache import missing
+
+# Reports are made of pages rendered to PDF in memory, in parallel in worker processes, and put
+# together into the report file in one write, through a temporary file named after the process
+# that is then renamed. Nothing else is written, so any number of reports can be made at once,
+# even of the same graph into the same file.
+# A task is a (function, args) pair, run as function(*args), or a (function, args, params) triple,
+# run as function(*args, **params), where the function is defined at the top level of a module so
+# that it can be sent to the workers.
+
+# Get the metrics of a graph from tasks, a dict of metric name -> task computing it. The metrics
+# that are not cached yet in metrics (a MetricsCache, see metrics_cache.py) are computed in
+# workers processes and cached, keyed by their name and the params of their task. The ones named in
+# pooled are the exception: their functions start their own pool of workers processes (given as
+# their workers argument), so they run one after the other in this process, where they can.
+# Returns a dict of metric name -> value.
+def compute_metrics(metrics, tasks, workers=None, pooled=()):
+    params = {name: task[2] if len(task) > 2 else {} for name, task in tasks.items()}
+    values = {name: metrics.lookup(name, params[name]) for name in tasks}
+    names = [name for name in tasks if values[name] is missing and name not in pooled]
+    for name, value in zip(names, run_tasks([tasks[name] for name in names], workers)):
+        metrics.store(name, params[name], value)
+        values[name] = value
+    workers = 1 if mp.current_process().daemon else workers or os.cpu_count() or 1
+    for name in pooled:
+        if values[name] is missing:
+            function, args = tasks[name][:2]
+            values[name] = function(*args, workers=workers, **params[name])
+            metrics.store(name, params[name], values[name])
+    return values
+
+# Render the pages of a report, each a task returning PDF bytes (like figure_page and text_page),
+# in workers processes, and write them in order to save_file.
+def write_report(pages, save_file, workers=None):
+    merger = PdfMerger()
+    for page in run_tasks(pages, workers):
+        merger.append(io.BytesIO(page))
+    temp_file = save_file + ".tmp%d" % os.getpid()
+    with open(temp_file, "wb") as f:
+        merger.write(f)
+    merger.close()
+    os.replace(temp_file, save_file)
+
+# Run the tasks in a pool of workers processes (by default one per core), and return their results
+# in order. They run in this process if workers is 1 or this is a worker of another pool.
+def run_tasks(tasks, workers=None):
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers <= 1 or mp.current_process().daemon:
+        return [run_task(task) for task in tasks]
+    with mp.get_context().Pool(workers) as pool:
+        return pool.map(run_task, tasks, chunksize=1)
+
+def run_task(task):
+    function, args = task[:2]
+    return function(*args, **(task[2] if len(task) > 2 else {}))
+
+# Render the figure plot(*args) draws with pyplot as a PDF page, and return its bytes.
+def figure_page(plot, *args):
+    plot(*args)
+    page = io.BytesIO()
+    plt.savefig(page, format="pdf")
+    plt.close()
+    return page.getvalue()
+
+# Render the text draw(c, *args) writes on a letter-size ReportLab canvas c as a PDF page, and
+# return its bytes.
+def text_page(draw, *args):
+    page = io.BytesIO()
+    c = canvas.Canvas(page, pagesize=letter)
+    draw(c, *args)
+    c.save()
+    return page.getvalue()
@@ -0,0 +1,162 @@
+import os
+import zlib
+import queue
+import multiprocessing as mp
+import networkx as nx
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import URLError
+from urllib.parse import urlsplit
+from fetcher3 import fetch_links
+from frontier import in_scope
+from politeness import PolitenessScheduler
+from csr_graph import save_graph
+
+def main():
+    # Crawl the Caltech domain with one worker process per core.
+    crawl_sharded("http://www.caltech.edu", 2000, "caltech_graph_2000.csr")
+
+# Crawl the web like crawl() in crawl.py, but across several worker processes so that parsing
+# pages is spread over all cores.
+# The url space is partitioned by a hash of the host, so every host belongs to exactly one worker
+# (which also keeps per-host politeness within one process). Each worker has its own BFS
+# frontier and set of seen urls, fetches its pages with `threads` concurrent fetches, and forwards
+# the links it finds to the workers owning them through their queues. The owner of a url decides
+# whether it becomes a node, and a shared counter caps the number of nodes at limit.
+# The partial edge lists of the workers are merged into one nx.DiGraph at the end. Pages are
+# visited in BFS order within each worker only, so the set of admitted nodes can differ from a
+# single-process crawl once the limit is reached.
+# If polite_rate is given, every worker obeys robots.txt and limits each host to that many
+# requests per second.
+def crawl_sharded(start_url, limit, save_file = None, domain = ".caltech.edu", workers = None, threads = 4, polite_rate = None):
+    workers = workers or os.cpu_count() or 1
+    ctx = mp.get_context()
+
+    # Shared counters: nodes admitted so far, and urls queued or being handled in any worker.
+    admitted = ctx.Value('q', 0)
+    pending = ctx.Value('q', 1)
+    inboxes = [ctx.Queue() for _ in range(workers)]
+    results = ctx.Queue()
+
+    # Hand the start url to its owner, then wait for all workers to run out of work.
+    inboxes[shard_of(start_url, workers)].put(start_url)
+    processes = [ctx.Process(target=crawl_shard, args=(shard, workers, limit, domain, threads, polite_rate, admitted, pending, inboxes, results)) for shard in range(workers)]
+    for process in processes:
+        process.start()
+    shards = [results.get() for _ in range(workers)]
+    for process in processes:
+        process.join()
+
+    # Merge the partial results: nodes that failed to be crawled are removed with their edges.
+    graph = nx.DiGraph()
+    failed = set()
+    for nodes, failures, out_links in shards:
+        graph.add_nodes_from(nodes)
+        failed.update(failures)
+    graph.remove_nodes_from(failed)
+    visited = 0
+    for nodes, failures, out_links in shards:
+        visited += len(out_links) + len(failures)
+        for url, links in out_links.items():
+            if url in graph:
+                graph.add_edges_from((url, link) for link in links if link in graph)
+    print("Successfully crawled", visited, "pages with", workers, "workers, producing a graph with n =", graph.number_of_nodes(), "nodes and m =", graph.number_of_edges(), "edges.")
+
+    # Save the graph to a file (in CSR format if it ends in .csr) if a save file is specified.
+    if save_file:
+        save_graph(graph, save_file)
+    print("Graph saved to ", save_file)
+    return graph
+
+# Get the worker that owns the url, from a hash of its host that is the same in every process.
+def shard_of(url, workers):
+    return zlib.crc32(urlsplit(url).netloc.lower().encode("utf-8")) % workers
+
+# The crawl loop of one worker process.
+# Every url in a queue or in a frontier counts once in pending, and is only uncounted after all
+# the urls it led to have been counted, so pending is 0 exactly when every worker is out of work.
+# The worker puts its admitted nodes (in admission order), its failed urls, and the in-domain
+# links of every page it visited on the results queue.
+def crawl_shard(shard, workers, limit, domain, threads, polite_rate, admitted, pending, inboxes, results):
+    inbox = inboxes[shard]
+    politeness = PolitenessScheduler(rate=polite_rate) if polite_rate is not None else None
+    executor = ThreadPoolExecutor(max_workers=threads)
+    frontier = deque()
+    seen = set()
+    forwarded = set()
+    nodes = []
+    failures = []
+    out_links = {}
+
+    # Admit a url owned by this worker as a node (if there is room) and queue it for a visit.
+    def discover(url):
+        if url in seen:
+            return
+        seen.add(url)
+        with admitted.get_lock():
+            if admitted.value >= limit:
+                return
+            admitted.value += 1
+        nodes.append(url)
+        frontier.append(url)
+        add_pending(1)
+
+    def add_pending(count):
+        with pending.get_lock():
+            pending.value += count
+            return pending.value
+
+    while True:
+        # Handle the urls forwarded by other workers.
+        try:
+            url = inbox.get(timeout=0.05) if not frontier else inbox.get_nowait()
+            discover(url)
+            add_pending(-1)
+            continue
+        except queue.Empty:
+            pass
+
+        # Stop once no worker has anything left to do.
+        if not frontier:
+            if add_pending(0) == 0:
+                break
+            continue
+
+        # Fetch a batch of pages from the front of the frontier.
+        batch = [frontier.popleft() for _ in range(min(threads, len(frontier)))]
+        for url, links in zip(batch, executor.map(lambda url: fetch_page_links(url, politeness), batch)):
+            print("shard", shard, "visited", len(out_links) + len(failures) + 1, "pages, visiting", url)
+            if links is URLError:
+                # The node is removed at the merge, which frees its place for another url.
+                print("URLError on ", url)
+                failures.append(url)
+                with admitted.get_lock():
+                    admitted.value -= 1
+            elif links is not None:
+                links = [link for link in dict.fromkeys(links) if in_scope(link, domain)]
+                out_links[url] = links
+                # Send every link to its owner, once per link.
+                for link in links:
+                    owner = shard_of(link, workers)
+                    if owner == shard:
+                        discover(link)
+                    elif link not in forwarded:
+                        forwarded.add(link)
+                        add_pending(1)
+                        inboxes[owner].put(link)
+            add_pending(-1)
+
+    executor.shutdown()
+    results.put((nodes, failures, out_links))
+
+# Fetch the links of a page, returning URLError instead of raising it so it can cross the thread pool.
+def fetch_page_links(url, politeness):
+    try:
+        if politeness is not None and not politeness.wait(url):
+            return None
+        return fetch_links(url)
+    except URLError:
+        return URLError
+
+if __name__ == "__main__":
+    main()
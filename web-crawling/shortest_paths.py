@@ -0,0 +1,265 @@
+import os
+import multiprocessing as mp
+import numpy as np
+from statistics import NormalDist
+from csr_graph import CSRGraph, to_csr, undirected_csr
+
+# Graphs with at most this many nodes get exact path statistics unless told otherwise.
+exact_node_limit = 50000
+
+# Number of BFS sources searched at once, one per bit of a uint64.
+batch_size = 64
+
+# Compute the diameter and average shortest path length of every connected component of a graph
+# (NetworkX or CSRGraph, treated as undirected), largest component first.
+# Distances are found by multi-source BFS over the CSR arrays: 64 sources are searched at once as
+# the bits of one uint64 per node, and the batches are spread over a pool of worker processes.
+# In exact mode every node is a source. In approximate mode, components with more than samples
+# nodes get the average from samples random sources, with a confidence interval, and the diameter
+# from iFUB, which is started from the middle of a double sweep and stops once its lower and upper
+# bounds meet or before it would run more than max_bfs searches (None for no limit).
+# exact=None picks exact mode for graphs with up to exact_node_limit nodes.
+# Every component is returned as a dictionary with its nodes, diameter (None if only bounds are
+# known), diameter_bounds, average_shortest_path, average_shortest_path_interval, sources (the
+# number of BFS searched from its nodes) and exact.
+def path_statistics(G, exact=None, samples=256, confidence=0.95, workers=None, seed=None, max_bfs=1024):
+    csr = undirected_csr(G if isinstance(G, CSRGraph) else to_csr(G))
+    if exact is None:
+        exact = csr.n <= exact_node_limit
+    rng = np.random.default_rng(seed)
+    labels, sizes = connected_components(csr)
+    order = np.argsort(labels, kind="stable")
+    starts = np.concatenate(([0], np.cumsum(sizes)))
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+
+    with BFSPool(csr, workers) as pool:
+        if exact:
+            ecc, total = pool.run(np.arange(csr.n))
+            sources = [order[starts[c]:starts[c + 1]] for c in range(len(sizes))]
+        else:
+            # Search from every node of the small components and from samples nodes of the others.
+            sources = []
+            for c in range(len(sizes)):
+                nodes = order[starts[c]:starts[c + 1]]
+                sources.append(nodes if len(nodes) <= samples else rng.choice(nodes, samples, replace=False))
+            ecc, total = np.zeros(csr.n, dtype=np.int64), np.zeros(csr.n, dtype=np.int64)
+            if sources:
+                searched = np.concatenate(sources)
+                ecc[searched], total[searched] = pool.run(searched)
+
+        components = []
+        for c in np.argsort(-sizes, kind="stable"):
+            nodes = order[starts[c]:starts[c + 1]]
+            k = len(nodes)
+            component = {"nodes": component_nodes(csr, nodes), "sources": len(sources[c]), "exact": len(sources[c]) == k}
+            # The mean distance from every source to the other k - 1 nodes.
+            means = total[sources[c]] / (k - 1) if k > 1 else np.zeros(len(sources[c]))
+            if component["exact"]:
+                diameter = int(ecc[nodes].max())
+                component["diameter"] = diameter
+                component["diameter_bounds"] = (diameter, diameter)
+                component["average_shortest_path"] = float(means.mean())
+                component["average_shortest_path_interval"] = (component["average_shortest_path"],) * 2
+            else:
+                lower, upper, searches = diameter_bounds(csr, nodes, pool, max_bfs)
+                lower = max(lower, int(ecc[sources[c]].max()))
+                component["diameter"] = lower if lower >= upper else None
+                component["diameter_bounds"] = (lower, max(lower, upper))
+                component["sources"] += searches
+                # Sample without replacement, so the standard error shrinks to 0 as samples nears k.
+                s = len(means)
+                error = z * means.std(ddof=1) / np.sqrt(s) * np.sqrt((k - s) / (k - 1)) if s > 1 else np.inf
+                component["average_shortest_path"] = float(means.mean())
+                component["average_shortest_path_interval"] = (float(means.mean() - error), float(means.mean() + error))
+            components.append(component)
+    return components
+
+# Get the nodes with the given indices, as labels if the graph has them.
+def component_nodes(csr, indices):
+    if csr.labels is None:
+        return indices.tolist()
+    if isinstance(csr.labels, np.ndarray):
+        return csr.labels[indices].tolist()
+    return [csr.labels[i] for i in indices]
+
+# Describe the path statistics of a graph with n nodes in lines of text for the analysis reports:
+# those of its largest connected component, which are those of the whole graph if it is connected.
+def path_statistics_lines(components, n, confidence=0.95):
+    if not components:
+        return ["Maximum diameter: undefined for an empty graph", "Average diameter: undefined for an empty graph"]
+    largest = components[0]
+    lines = []
+    if len(components) > 1:
+        lines.append("The graph has " + str(len(components)) + " connected components; the largest, with " + str(len(largest["nodes"])) + " of the " + str(n) + " nodes, is used below.")
+    if largest["diameter"] is not None:
+        lines.append("Maximum diameter: " + str(largest["diameter"]))
+    else:
+        lines.append("Maximum diameter: between " + str(largest["diameter_bounds"][0]) + " and " + str(largest["diameter_bounds"][1]))
+    if largest["exact"]:
+        lines.append("Average diameter: " + str(largest["average_shortest_path"]))
+    else:
+        low, high = largest["average_shortest_path_interval"]
+        lines.append("Average diameter: " + str(largest["average_shortest_path"]) + " (" + str(round(confidence * 100)) + "% confidence interval " + str(low) + " to " + str(high) + ", from " + str(largest["sources"]) + " BFS)")
+    return lines
+
+# Label the connected components of an undirected CSRGraph 0 ... c-1, returning the label of every
+# node and the size of every component.
+# Every node starts with its own index as label, and takes the smallest label among its neighbors
+# until nothing changes. Pointer jumping (following labels to the label of their node) makes this
+# converge in far fewer rounds than the diameter on long paths.
+def connected_components(csr):
+    labels = np.arange(csr.n)
+    offsets = np.asarray(csr.offsets)
+    neighbors = np.asarray(csr.neighbors)
+    rows = np.flatnonzero(np.diff(offsets))
+    while len(neighbors):
+        smallest = labels.copy()
+        smallest[rows] = np.minimum(labels[rows], np.minimum.reduceat(labels[neighbors], offsets[rows]))
+        # A node's label also lowers the label of the node its old label points to.
+        np.minimum.at(smallest, labels, smallest)
+        smallest = smallest[smallest]
+        if np.array_equal(smallest, labels):
+            break
+        labels = smallest
+    roots, labels = np.unique(labels, return_inverse=True)
+    return labels, np.bincount(labels, minlength=len(roots))
+
+# Get the distance from a source node to every node of an undirected CSRGraph (-1 if unreachable).
+def bfs_distances(csr, source):
+    offsets = np.asarray(csr.offsets)
+    neighbors = np.asarray(csr.neighbors)
+    distances = np.full(csr.n, -1, dtype=np.int64)
+    distances[source] = 0
+    frontier = np.array([source])
+    depth = 0
+    while len(frontier):
+        depth += 1
+        reached = neighbors[neighbor_positions(offsets, frontier)]
+        reached = reached[distances[reached] < 0]
+        distances[reached] = depth
+        # Remove the repeated nodes by sorting small frontiers and by scanning for large ones.
+        frontier = np.unique(reached) if len(reached) * 64 < csr.n else np.flatnonzero(distances == depth)
+    return distances
+
+# Get the positions in neighbors of the neighbors of every node in nodes.
+def neighbor_positions(offsets, nodes):
+    starts = offsets[nodes]
+    counts = offsets[nodes + 1] - starts
+    ends = np.cumsum(counts)
+    return np.repeat(starts - (ends - counts), counts) + np.arange(ends[-1] if len(ends) else 0)
+
+# Bound the diameter of the connected component with the given nodes, with at most max_bfs BFS
+# (None for no limit). Returns the lower and upper bounds and the number of BFS run.
+# A double sweep (BFS from the highest degree node, then from the farthest node a it found) gives
+# a lower bound, and iFUB is started from u, the middle of a shortest path from a to the farthest
+# node b from a. Every node at distance i from u has eccentricity at most 2i, so going through the
+# levels of u from the farthest down, once the largest eccentricity seen is more than 2(i-1) no
+# closer node can have a larger one.
+def diameter_bounds(csr, nodes, pool, max_bfs=None):
+    degree = np.diff(np.asarray(csr.offsets))
+    start = nodes[np.argmax(degree[nodes])]
+    a = int(np.argmax(bfs_distances(csr, start)))
+    from_a = bfs_distances(csr, a)
+    b = int(np.argmax(from_a))
+    from_b = bfs_distances(csr, b)
+    lower = int(from_a[b])
+    middle = np.flatnonzero((from_a + from_b == lower) & (from_a == lower // 2))
+    from_u = bfs_distances(csr, middle[0])
+    searches = 4
+
+    level = int(from_u.max())
+    lower = max(lower, level)
+    upper = 2 * level
+    while upper > lower and level > 0:
+        fringe = np.flatnonzero(from_u == level)
+        if max_bfs is not None and searches + len(fringe) > max_bfs:
+            break
+        ecc, total = pool.run(fringe)
+        searches += len(fringe)
+        lower = max(lower, int(ecc.max()))
+        if lower > 2 * (level - 1):
+            upper = lower
+            break
+        upper = 2 * (level - 1)
+        level -= 1
+    return lower, max(lower, upper), searches
+
+# Run multi-source BFS from up to 64 sources of an undirected graph with the given CSR arrays,
+# returning the eccentricity of every source and the sum of its distances to the nodes it reaches.
+# Bit j of seen[v] is set once source j reached node v. Levels with a small frontier push the
+# frontier's bits to its neighbors, and larger ones have every node pull the bits of its neighbors,
+# which reads the neighbor array in order.
+def multi_source_bfs(offsets, neighbors, sources):
+    n = len(offsets) - 1
+    k = len(sources)
+    bits = np.left_shift(np.uint64(1), np.arange(k, dtype=np.uint64))
+    seen = np.zeros(n, dtype=np.uint64)
+    seen[sources] = bits
+    frontier = seen.copy()
+    active = np.asarray(sources)
+    rows = np.flatnonzero(np.diff(offsets))
+    ecc = np.zeros(k, dtype=np.int64)
+    total = np.zeros(k, dtype=np.int64)
+    depth = 0
+    while len(active):
+        depth += 1
+        if (offsets[active + 1] - offsets[active]).sum() * 8 < len(neighbors):
+            positions = neighbor_positions(offsets, active)
+            reached = np.zeros(n, dtype=np.uint64)
+            np.bitwise_or.at(reached, neighbors[positions], np.repeat(frontier[active], offsets[active + 1] - offsets[active]))
+        else:
+            reached = np.zeros(n, dtype=np.uint64)
+            reached[rows] = np.bitwise_or.reduceat(frontier[neighbors], offsets[rows])
+        new = reached & ~seen
+        active = np.flatnonzero(new)
+        seen[active] |= new[active]
+        frontier = np.zeros(n, dtype=np.uint64)
+        frontier[active] = new[active]
+
+        # Count the nodes every source reached at this depth.
+        counts = np.unpackbits(new[active].astype("<u8").view(np.uint8), bitorder="little").reshape(-1, 64).sum(axis=0, dtype=np.int64)[:k]
+        total += depth * counts
+        ecc[counts > 0] = depth
+    return ecc, total
+
+# A pool of worker processes running multi-source BFS over one graph. Every worker receives the
+# CSR arrays once, when it starts. With workers=1 the searches run in this process, as they do in
+# the worker processes of another pool (which cannot start processes of their own).
+class BFSPool:
+    def __init__(self, csr, workers=None):
+        self.offsets = np.asarray(csr.offsets)
+        self.neighbors = np.asarray(csr.neighbors)
+        self.workers = 1 if mp.current_process().daemon else workers or os.cpu_count() or 1
+        self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+
+    # Get the eccentricity of every source and the sum of its distances.
+    def run(self, sources):
+        sources = np.asarray(sources)
+        batches = [sources[i:i + batch_size] for i in range(0, len(sources), batch_size)]
+        if self.workers == 1 or len(batches) == 1:
+            results = [multi_source_bfs(self.offsets, self.neighbors, batch) for batch in batches]
+        else:
+            if self.pool is None:
+                self.pool = mp.get_context().Pool(self.workers, initializer=init_worker, initargs=(self.offsets, self.neighbors))
+            results = self.pool.map(worker_bfs, batches, chunksize=max(1, len(batches) // (4 * self.workers)))
+        if not results:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        return np.concatenate([ecc for ecc, total in results]), np.concatenate([total for ecc, total in results])
+
+# The CSR arrays of the graph searched by a pool worker.
+worker_graph = None
+
+def init_worker(offsets, neighbors):
+    global worker_graph
+    worker_graph = (offsets, neighbors)
+
+def worker_bfs(sources):
+    return multi_source_bfs(worker_graph[0], worker_graph[1], sources)
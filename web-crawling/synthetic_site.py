@@ -0,0 +1,98 @@
+import time
+import zlib
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Serve a graph as a synthetic website on localhost so the crawler can be exercised offline.
+# Every node becomes an HTML page at /page/<index>.html (index = position in G.nodes()) whose
+# hyperlinks point to the pages of the node's successors (or neighbors for undirected graphs).
+# Pages carry an ETag and answer conditional requests for unchanged pages with 304.
+# If robots_txt is given, it is served as /robots.txt (otherwise /robots.txt is a 404), and the
+# server keeps the time of every page request in server.requests.
+# To make the site behave more like a real one, every page can be delayed by latency seconds,
+# padded with text to at least page_bytes bytes, and a random error_rate fraction of the pages
+# (picked once from seed, so every run fails the same pages) answer with a 500 error.
+# The server counts the bytes of the pages it sent in server.bytes_sent.
+# Return the running server and the base url of the site; stop it with stop_site(server).
+def serve_graph(G, host="127.0.0.1", port=0, robots_txt=None, latency=0.0, page_bytes=0, error_rate=0.0, seed=0):
+    # Render every page up front so requests are served without touching the graph.
+    index = {node: i for i, node in enumerate(G.nodes())}
+    adjacency = G.succ if G.is_directed() else G.adj
+    pages = []
+    for node in G.nodes():
+        links = "".join('<a href="/page/%d.html">%d</a>\n' % (index[v], index[v]) for v in adjacency[node])
+        page = "<html><body>\n" + links
+        if len(page) < page_bytes:
+            page += filler_text(page_bytes - len(page))
+        pages.append((page + "</body></html>\n").encode("utf-8"))
+    rng = random.Random(seed)
+    failing = set(i for i in range(len(pages)) if rng.random() < error_rate)
+
+    server = ThreadingHTTPServer((host, port), _SiteHandler)
+    server.daemon_threads = True
+    server.pages = pages
+    server.failing = failing
+    server.latency = latency
+    server.robots_txt = robots_txt.encode("utf-8") if robots_txt is not None else None
+    server.requests = []
+    server.bytes_sent = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://%s:%d" % server.server_address[:2]
+
+# Make paragraphs of text of about the given size to pad a page with.
+def filler_text(size):
+    paragraph = "<p>" + "The quick brown fox jumps over the lazy dog. " * 8 + "</p>\n"
+    return paragraph * (size // len(paragraph) + 1)
+
+# Get the url of the page serving the node at the given index of G.nodes().
+def page_url(base_url, index):
+    return base_url + "/page/" + str(index) + ".html"
+
+# Shut down a site started by serve_graph.
+def stop_site(server):
+    server.shutdown()
+    server.server_close()
+
+# Request handler serving the pre-rendered pages over keep-alive HTTP/1.1.
+class _SiteHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        pages = self.server.pages
+        path = self.path.split("?")[0]
+        if path.startswith("/page/") and path.endswith(".html") and path[6:-5].isdigit() and int(path[6:-5]) < len(pages):
+            page = pages[int(path[6:-5])]
+            if self.server.robots_txt is not None:
+                self.server.requests.append((time.monotonic(), path))
+            if self.server.latency:
+                time.sleep(self.server.latency)
+            etag = '"%08x"' % zlib.crc32(page)
+            if int(path[6:-5]) in self.server.failing:
+                self.send_body(500, "text/plain", b"internal server error\n")
+            elif self.headers.get("If-None-Match") == etag:
+                self.send_body(304, None, b"", etag)
+            else:
+                self.send_body(200, "text/html; charset=utf-8", page, etag)
+        elif path == "/robots.txt" and self.server.robots_txt is not None:
+            self.send_body(200, "text/plain", self.server.robots_txt)
+        else:
+            self.send_body(404, "text/plain", b"not found\n")
+
+    def send_body(self, status, content_type, body, etag=None):
+        self.send_response(status)
+        if content_type is not None:
+            self.send_header("Content-Type", content_type)
+        if etag is not None:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with self.server.lock:
+            self.server.bytes_sent += len(body)
+
+    # Keep the crawler's output readable by not logging every request.
+    def log_message(self, format, *args):
+        pass
@@ -1,22 +1,23 @@
-import random
-import pickle
-import itertools
 import numpy as np
 import networkx as nx
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_pdf import PdfPages
+import csr_graph
+from layout_cache import get_layout
+from render import draw_graph
 
-caltech_graph_pkl_file = "out/caltech_graph_2000.pkl"
+caltech_graph_file = "out/caltech_graph_2000.csr"
 
-def main():
+# With draw_large_graph, the whole Caltech graph is also drawn with the force-directed layout.
+def main(draw_large_graph=False):
     # Create a PDF file for saving the plots
     pdf = PdfPages("out/varying_visualizations.pdf")
 
     # Generate the graphs
-    gnp = generate_erdos_renyi_graph(40, 0.3, "out/erdos_renyi.pkl")
-    ssbm, ssbm_community_map = generate_ssbm_graph(30, 4, 0.75, 0.15, "out/ssbm.pkl")
-    caltech150 = generate_first_n_subgraph(caltech_graph_pkl_file, 150, "out/caltech_graph_150.pkl")
-    caltech400 = generate_first_n_subgraph(caltech_graph_pkl_file, 400, "out/caltech_graph_400.pkl")
+    gnp = generate_erdos_renyi_graph(40, 0.3, "out/erdos_renyi.csr")
+    ssbm, ssbm_community_map = generate_ssbm_graph(30, 4, 0.75, 0.15, "out/ssbm.csr")
+    caltech150 = generate_first_n_subgraph(caltech_graph_file, 150, "out/caltech_graph_150.csr")
+    caltech400 = generate_first_n_subgraph(caltech_graph_file, 400, "out/caltech_graph_400.csr")
     graphs = [gnp, ssbm, caltech150, caltech400]
     titles = ["Erdos-Renyi G(n=40, p=0.3)", "SSBM G(n=30, k=4, A=0.75, B=0.15)", "Caltech 150 nodes", "Caltech 400 nodes"]
     labels_on = [True, True, False, False]
@@ -28,21 +29,24 @@ def main():
         if i == 1:
             visualize_colored_ssbm(graphs[i], ssbm_community_map, "Colored Communities for " + titles[i], pdf, labels_on[i])
 
+    # Draw the whole Caltech graph, which is too large for the spring layout
+    if draw_large_graph:
+        caltech = csr_graph.load_graph(caltech_graph_file)
+        visualize_large_graph(caltech, "Force-directed layout of the Caltech graph (" + str(caltech.number_of_nodes()) + " nodes)", pdf)
+
     # Close the PDF file
     pdf.close()
 
 
 # Generate an Erdos-Renyi graph with n nodes and probability p of each edge existing.
 # Return the graph and optionally save it to a file if specified.
-def generate_erdos_renyi_graph(n, p, save_file=None):
+# Only nodes with at least one edge are in the graph. Pass a seed for a reproducible graph.
+def generate_erdos_renyi_graph(n, p, save_file=None, seed=None):
     # Create a new graph
     G = nx.Graph()
 
     # Each node is connected to every other node with probability p
-    nodes = list(range(n))
-    for i, j in itertools.combinations(nodes, 2):
-        if (random.random() < p):
-            G.add_edge(i, j)
+    G.add_edges_from(erdos_renyi_edges(n, p, seed).tolist())
 
     # Save the graph to a file
     if (save_file is not None):
@@ -54,36 +58,24 @@ def generate_erdos_renyi_graph(n, p, save_file=None):
     # Return the graph
     return G
 
+# Sample the edges of an Erdos-Renyi graph G(n, p) as an (m, 2) array of node pairs i < j,
+# in lexicographic order, in time proportional to n + m rather than n^2.
+def erdos_renyi_edges(n, p, seed=None):
+    rng = np.random.default_rng(seed)
+    return triangle_pairs(bernoulli_positions(n * (n - 1) // 2, p, rng), n)
+
 # Generate a Symmetric Stochastic Block Model graph with n nodes, k evenly distributed 
 # communities, and probability matrix with A on the diagonal and B outside the diagonal.
 # Return the graph and a list mapping each node to its community
-# and optionally save it to a file if specified.
-def generate_ssbm_graph(n, k, A, B, save_file=None):
-    # Initialize undirected graph
+# and optionally save it to a file if specified. Pass a seed for a reproducible graph.
+def generate_ssbm_graph(n, k, A, B, save_file=None, seed=None):
+    # Initialize undirected graph with all the nodes
     G = nx.Graph()
-
-    # Create the communities
-    communities = np.array_split(np.arange(n), k)
-
-    # Map each node to its community and add all nodes to the graph
-    node_to_community = np.zeros(n)
-    for community_count in range(len(communities)):
-        community = communities[community_count]
-        for node in community:
-            node_to_community[node] = community_count
-            G.add_node(node)
+    G.add_nodes_from(range(n))
 
     # Connect nodes within and between communities with prob A and B respectively
-    for node_i in range(n):
-        for node_j in range(node_i+1, n):
-            if node_i == node_j:
-                continue
-            if node_to_community[node_i] == node_to_community[node_j]:
-                if random.random() < A:
-                    G.add_edge(node_i, node_j)
-            else:
-                if random.random() < B:
-                    G.add_edge(node_i, node_j)
+    edges, node_to_community = ssbm_edges(n, k, A, B, seed)
+    G.add_edges_from(edges.tolist())
 
     # Save the graph to a file
     if (save_file is not None):
@@ -94,19 +86,75 @@ def generate_ssbm_graph(n, k, A, B, save_file=None):
 
     # Return the graph
     return G, node_to_community
+
+# Sample the edges of a Symmetric Stochastic Block Model graph as an (m, 2) array of node pairs
+# i < j in lexicographic order, in time proportional to n + k^2 + m rather than n^2.
+# Return the edges and the array mapping each node to its community.
+def ssbm_edges(n, k, A, B, seed=None):
+    rng = np.random.default_rng(seed)
+
+    # The communities are consecutive ranges of nodes, as split by np.array_split.
+    sizes = np.array([len(community) for community in np.array_split(np.arange(n), k)], dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    node_to_community = np.repeat(np.arange(k), sizes).astype(float)
+
+    # Sample every block of the probability matrix on its own: the pairs within a community
+    # with prob A, and the pairs between two communities with prob B.
+    blocks = []
+    for c in range(k):
+        blocks.append(starts[c] + triangle_pairs(bernoulli_positions(sizes[c] * (sizes[c] - 1) // 2, A, rng), sizes[c]))
+        for d in range(c + 1, k):
+            positions = bernoulli_positions(sizes[c] * sizes[d], B, rng)
+            blocks.append(np.column_stack((starts[c] + positions // sizes[d], starts[d] + positions % sizes[d])))
+    edges = np.concatenate(blocks) if blocks else np.empty((0, 2), dtype=np.int64)
+    edges = edges[np.lexsort((edges[:, 1], edges[:, 0]))]
+    return edges, node_to_community
+
+# Sample which of `count` independent trials with success probability p succeed, returning the
+# indices of the successes in increasing order. Instead of drawing a number per trial, draw the
+# geometrically distributed gaps between successes, so the cost is proportional to the successes.
+def bernoulli_positions(count, p, rng):
+    count = int(count)
+    if count <= 0 or p <= 0:
+        return np.empty(0, dtype=np.int64)
+    if p >= 1:
+        return np.arange(count, dtype=np.int64)
+    chunks = []
+    last = -1
+    while True:
+        # Draw a few standard deviations more gaps than expected, so one round is usually enough.
+        expected = (count - last) * p
+        gaps = rng.geometric(p, int(expected + 5 * np.sqrt(expected) + 16))
+        positions = last + np.cumsum(gaps)
+        chunks.append(positions[positions < count])
+        if positions[-1] >= count:
+            return np.concatenate(chunks)
+        last = positions[-1]
+
+# Map indices of node pairs i < j of n nodes, numbered in lexicographic order as by
+# itertools.combinations(range(n), 2), back to the (m, 2) array of pairs.
+def triangle_pairs(indices, n):
+    indices = np.asarray(indices, dtype=np.int64)
+    # Row i starts at index i * (2n - i - 1) / 2. Invert that, then correct any rounding errors.
+    b = 2 * n - 1
+    i = np.floor((b - np.sqrt(np.maximum(b * b - 8 * indices.astype(np.float64), 0))) / 2).astype(np.int64)
+    row_start = lambda row: row * (b - row) // 2
+    i -= row_start(i) > indices
+    i += row_start(i + 1) <= indices
+    j = indices - row_start(i) + i + 1
+    return np.column_stack((i, j))
                 
 # Generate a subgraph of the first n nodes in the graph.
 # Return the graph and optionally save it to a file if specified.
-def generate_first_n_subgraph(graph_pkl_file, n, save_file=None):
-    # Load the graph from the pickle file
+def generate_first_n_subgraph(graph_file, n, save_file=None):
+    # Load the graph from the CSR directory or pickle file
     G = None
     try:
-        with open(graph_pkl_file, 'rb') as f:
-            G = pickle.load(f)
+        G = csr_graph.load_graph(graph_file)
     except:
         pass
     if (G is None):
-        print("Error: Graph could not be loaded from", graph_pkl_file)
+        print("Error: Graph could not be loaded from", graph_file)
         return
     if n > G.number_of_nodes():
         print("Error: n is greater than the number of nodes in the graph.")
@@ -120,7 +168,7 @@ def generate_first_n_subgraph(graph_pkl_file, n, save_file=None):
 
     # Save the graph to a file
     if (save_file is not None):
-        save_graph(G, save_file)
+        save_graph(G_sub, save_file)
         print("Subgraph of first " +str(n)+ " nodes has been saved to " +save_file+ ".")
     else:
         print("Subgraph of first " +str(n)+ " nodes has been generated.")
@@ -137,35 +185,35 @@ def variety_visualize_graph(G, title, pdf_pages=None, with_labels=True):
 
     # Spring layout
     plt.subplot(3, 2, 1)
-    nx.draw(G, with_labels=with_labels, font_weight='bold', pos=nx.spring_layout(G))
+    draw_graph(G, with_labels=with_labels, font_weight='bold', pos=get_layout(G))
     plt.title("Spring layout")
 
     # Random layout
     plt.subplot(3, 2, 2)
-    nx.draw(G, with_labels=with_labels, pos=nx.random_layout(G))
+    draw_graph(G, with_labels=with_labels, pos=get_layout(G, "random"))
     plt.title("Random layout")
 
     # Circular layout
     plt.subplot(3, 2, 3)
-    nx.draw(G, with_labels=with_labels, pos=nx.circular_layout(G))
+    draw_graph(G, with_labels=with_labels, pos=get_layout(G, "circular"))
     plt.title("Circular layout")
 
     # Shell layout
     plt.subplot(3, 2, 4)
-    nx.draw(G, with_labels=with_labels, pos=nx.shell_layout(G))
+    draw_graph(G, with_labels=with_labels, pos=get_layout(G, "shell"))
     plt.title("Shell layout")
 
     # Planar layout
     plt.subplot(3, 2, 5)
     try:
-        nx.draw(G, with_labels=with_labels, pos=nx.planar_layout(G))
+        draw_graph(G, with_labels=with_labels, pos=get_layout(G, "planar"))
     except: 
         plt.text(0.5, 0.5, "Layout not possible (G is not planar)", horizontalalignment='center', verticalalignment='center', transform=plt.gca().transAxes)
     plt.title("Planar layout")
 
     # Spectral layout
     plt.subplot(3, 2, 6)
-    nx.draw(G, with_labels=with_labels, pos=nx.spectral_layout(G))
+    draw_graph(G, with_labels=with_labels, pos=get_layout(G, "spectral"))
     plt.title("Spectral layout")
 
     # Give a title to the entire figure
@@ -190,7 +238,22 @@ def visualize_degree_scaled_graph(G, title, pdf_pages=None, with_labels=True):
     # Generate the figure
     plt.figure(figsize=(12, 13))
     plt.title(title, fontsize=20)
-    nx.draw(G, node_size=node_sizes, node_color="lightblue", edgecolors="black", linewidths=2, with_labels=with_labels, pos=nx.spring_layout(G))
+    draw_graph(G, node_size=node_sizes, node_color="lightblue", edgecolors="black", linewidths=2, with_labels=with_labels, pos=get_layout(G))
+
+    if pdf_pages is not None:
+        pdf_pages.savefig()  
+        plt.close()  
+    else:
+        plt.show()
+
+# Visualize a large graph with small nodes and thin edges, laid out by force_layout (see
+# force_layout.py), which takes seconds on graphs with thousands of nodes.
+def visualize_large_graph(G, title, pdf_pages=None, layout="force"):
+    print("Visualizing", title)
+
+    plt.figure(figsize=(12, 13))
+    plt.title(title, fontsize=20)
+    draw_graph(G, node_size=4, node_color="tab:blue", edge_color="gray", width=0.2, alpha=0.8, pos=get_layout(G, layout))
 
     if pdf_pages is not None:
         pdf_pages.savefig()  
@@ -207,16 +270,16 @@ def visualize_colored_ssbm(G, node_to_community, title, pdf_pages=None, with_lab
 
     # Spring layout with colored communities
     plt.subplot(1, 2, 1)
-    pos = nx.spring_layout(G)
+    pos = get_layout(G)
     colors = [node_to_community[node] for node in G.nodes()]
-    nx.draw(G, with_labels=with_labels, font_weight='bold', pos=pos, node_color=colors, cmap=plt.cm.tab20)
+    draw_graph(G, with_labels=with_labels, font_weight='bold', pos=pos, node_color=colors, cmap=plt.cm.tab20)
     plt.title("Spring layout with colored communities")
 
     # Circular layout with colored communities
     plt.subplot(1, 2, 2)
-    pos = nx.circular_layout(G)
+    pos = get_layout(G, "circular")
     colors = [node_to_community[node] for node in G.nodes()]
-    nx.draw(G, with_labels=with_labels, pos=pos, node_color=colors, cmap=plt.cm.tab20)
+    draw_graph(G, with_labels=with_labels, pos=pos, node_color=colors, cmap=plt.cm.tab20)
     plt.title("Circular layout with colored communities")
 
     # Give a title to the entire figure
@@ -231,10 +294,9 @@ def visualize_colored_ssbm(G, node_to_community, title, pdf_pages=None, with_lab
     else:
         plt.show()
 
-# Simply save the graph to a file.
+# Simply save the graph to a file, in CSR format if it ends in .csr and pickled otherwise.
 def save_graph(G, save_file):
-    with open(save_file, "wb") as f:
-        pickle.dump(G, f)
+    csr_graph.save_graph(G, save_file)
     
 if __name__ == "__main__":
     main()
\ No newline at end of file
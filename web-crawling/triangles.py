@@ -0,0 +1,175 @@
+import multiprocessing as mp
+import numpy as np
+from statistics import NormalDist
+from csr_graph import CSRGraph, to_csr, undirected_csr
+
+# Graphs with at most this many oriented wedges (see count_triangles) get exact statistics unless
+# told otherwise.
+exact_wedge_limit = 200 * 1000 * 1000
+
+# Number of wedges checked at once, which bounds the memory of the exact count.
+chunk_wedges = 4 * 1000 * 1000
+
+# Compute the triangle and clustering statistics of a graph (NetworkX or CSRGraph, treated as
+# undirected without self-loops) in one pass: the triangles and local clustering of every node (in
+# the order of G.nodes()), the number of triangles, the average clustering and the transitivity,
+# which match nx.triangles, nx.clustering, nx.average_clustering and nx.transitivity.
+# In exact mode the triangles are counted by count_triangles, in chunks spread over workers
+# processes. In approximate mode random wedges (paths u - v - w) are checked for the edge u - w
+# closing them instead: wedges picked uniformly estimate the transitivity, and one wedge at each of
+# samples random nodes the average clustering, both with a confidence interval. Per-node triangles
+# and clustering are then None. exact=None picks exact mode if the graph has at most
+# exact_wedge_limit oriented wedges.
+def clustering_statistics(G, exact=None, samples=100000, confidence=0.95, workers=1, seed=None):
+    csr = undirected_csr(G if isinstance(G, CSRGraph) else to_csr(G))
+    degree = np.diff(np.asarray(csr.offsets))
+    wedges = int((degree * (degree - 1) // 2).sum())
+    if exact is None:
+        exact = oriented_wedges(csr) <= exact_wedge_limit
+
+    if exact:
+        triangles = count_triangles(csr, workers)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            clustering = np.where(degree > 1, 2 * triangles / (degree * (degree - 1.0)), 0.0)
+        total = int(triangles.sum()) // 3
+        return {
+            "triangles": triangles,
+            "clustering": clustering,
+            "total_triangles": total,
+            "average_clustering": float(clustering.mean()) if csr.n else 0.0,
+            "transitivity": 3 * total / wedges if wedges else 0.0,
+            "exact": True,
+        }
+
+    rng = np.random.default_rng(seed)
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    keys = edge_keys(csr)
+
+    # Pick wedges uniformly: their center v with probability proportional to its d(d-1)/2 wedges.
+    transitivity, transitivity_error = 0.0, 0.0
+    if wedges:
+        centers = rng.choice(csr.n, samples, p=degree * (degree - 1) / (2 * wedges))
+        closed = closed_wedges(csr, keys, centers, rng)
+        transitivity = float(closed.mean())
+        transitivity_error = z * float(np.sqrt(transitivity * (1 - transitivity) / samples))
+
+    # The local clustering of a node is the fraction of its wedges that are closed, so one random
+    # wedge at each of samples random nodes is closed with probability the average clustering.
+    average_clustering, average_clustering_error = 0.0, 0.0
+    if csr.n:
+        nodes = rng.integers(0, csr.n, samples)
+        nodes = nodes[degree[nodes] > 1]
+        closed = int(np.count_nonzero(closed_wedges(csr, keys, nodes, rng))) if len(nodes) else 0
+        average_clustering = closed / samples
+        average_clustering_error = z * float(np.sqrt(average_clustering * (1 - average_clustering) / samples))
+
+    return {
+        "triangles": None,
+        "clustering": None,
+        "total_triangles": round(transitivity * wedges / 3),
+        "average_clustering": average_clustering,
+        "average_clustering_interval": (max(0.0, average_clustering - average_clustering_error), min(1.0, average_clustering + average_clustering_error)),
+        "transitivity": transitivity,
+        "transitivity_interval": (max(0.0, transitivity - transitivity_error), min(1.0, transitivity + transitivity_error)),
+        "exact": False,
+    }
+
+# Count the triangles at every node of a simple undirected CSRGraph.
+# Every edge is oriented from its endpoint of lower degree to the one of higher degree (ties broken
+# by index), which leaves every node at most sqrt(2m) out-neighbors. Each triangle is then found
+# exactly once, from its lowest node u, as a pair v < w of out-neighbors of u with the edge v -> w.
+# The pairs are checked against the sorted oriented edges in chunks of chunk_wedges, in workers
+# processes if workers > 1.
+def count_triangles(csr, workers=1):
+    keys = oriented_edges(csr)
+    # The end of the row of every position: the wedges of position p pair it with p+1 ... end-1.
+    row_ends = np.searchsorted(keys, ((keys >> 32) + 1) << 32)
+    rank_triangles = np.zeros(csr.n, dtype=np.int64)
+    chunks = wedge_chunks(row_ends)
+    if workers > 1 and len(chunks) > 1:
+        with mp.get_context().Pool(workers, initializer=init_worker, initargs=(keys, row_ends)) as pool:
+            results = pool.map(worker_triangles, chunks)
+    else:
+        results = [chunk_triangles(keys, row_ends, start, end) for start, end in chunks]
+    for corners in results:
+        rank_triangles += np.bincount(corners, minlength=csr.n)
+
+    # Map the counts back from the degree order to the node indices.
+    degree = np.diff(np.asarray(csr.offsets))
+    order = np.argsort(degree, kind="stable")
+    triangles = np.zeros(csr.n, dtype=np.int64)
+    triangles[order] = rank_triangles
+    return triangles
+
+# Get the number of wedges count_triangles checks on a simple undirected CSRGraph.
+def oriented_wedges(csr):
+    out_degree = np.bincount(oriented_edges(csr) >> 32, minlength=csr.n)
+    return int((out_degree * (out_degree - 1) // 2).sum())
+
+# Renumber the nodes of a simple undirected CSRGraph by increasing degree, and keep only the edges
+# u -> v from lower to higher numbers. Returns their keys (u << 32) | v, sorted.
+def oriented_edges(csr):
+    degree = np.diff(np.asarray(csr.offsets))
+    order = np.argsort(degree, kind="stable")
+    rank = np.empty(csr.n, dtype=np.int64)
+    rank[order] = np.arange(csr.n)
+    src = rank[csr.sources()]
+    dst = rank[np.asarray(csr.neighbors)]
+    keep = src < dst
+    return np.sort((src[keep] << 32) | dst[keep])
+
+# Split the oriented edge positions into ranges (start, end) that each start about chunk_wedges
+# wedges.
+def wedge_chunks(row_ends):
+    if not len(row_ends):
+        return []
+    cumulative = np.cumsum(row_ends - np.arange(len(row_ends)) - 1)
+    bounds = np.searchsorted(cumulative, np.arange(chunk_wedges, cumulative[-1], chunk_wedges))
+    bounds = np.unique(np.concatenate(([0], bounds, [len(row_ends)])))
+    return [(int(start), int(end)) for start, end in zip(bounds[:-1], bounds[1:])]
+
+# Find the triangles closed by the wedges starting at oriented edge positions start ... end-1, and
+# return the three corners of each of them (as one array, to be counted with np.bincount).
+def chunk_triangles(keys, row_ends, start, end):
+    positions = np.arange(start, end)
+    counts = row_ends[start:end] - positions - 1
+    total = int(counts.sum())
+    if not total:
+        return np.zeros(0, dtype=np.int64)
+    first = np.repeat(positions, counts)
+    # The second position of every pair runs from first + 1 to the end of the row.
+    second = first + 1 + np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    v, w = keys[first] & 0xFFFFFFFF, keys[second] & 0xFFFFFFFF
+    wanted = (v << 32) | w
+    found = np.minimum(np.searchsorted(keys, wanted), len(keys) - 1)
+    closed = keys[found] == wanted
+    return np.concatenate((keys[first[closed]] >> 32, v[closed], w[closed]))
+
+# Get the sorted keys (u << 32) | v of the edges of an undirected CSRGraph, in both directions.
+def edge_keys(csr):
+    return (csr.sources().astype(np.int64) << 32) | np.asarray(csr.neighbors, dtype=np.int64)
+
+# Pick a random wedge at every center (which all have degree at least 2) and tell whether it is
+# closed by an edge between its two ends.
+def closed_wedges(csr, keys, centers, rng):
+    offsets = np.asarray(csr.offsets)
+    neighbors = np.asarray(csr.neighbors, dtype=np.int64)
+    degree = offsets[centers + 1] - offsets[centers]
+    # Two distinct random neighbors: the second is drawn from the d - 1 others.
+    i = rng.integers(0, degree)
+    j = rng.integers(0, degree - 1)
+    j = j + (j >= i)
+    u, w = neighbors[offsets[centers] + i], neighbors[offsets[centers] + j]
+    wanted = (u << 32) | w
+    found = np.minimum(np.searchsorted(keys, wanted), len(keys) - 1)
+    return keys[found] == wanted
+
+# The oriented edges of the graph a pool worker counts triangles in, and their row ends.
+worker_graph = None
+
+def init_worker(keys, row_ends):
+    global worker_graph
+    worker_graph = (keys, row_ends)
+
+def worker_triangles(chunk):
+    return chunk_triangles(worker_graph[0], worker_graph[1], chunk[0], chunk[1])